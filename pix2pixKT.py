@@ -49,7 +49,15 @@
 # ![sample output_1](https://www.tensorflow.org/images/gan/pix2pix_1.png)
 # ![sample output_2](https://www.tensorflow.org/images/gan/pix2pix_2.png)
 
+
 # ## Import TensorFlow and other libraries
+#
+# Importing this file only defines the configuration and functions below, so
+# `load`, `Generator`, `train_step` and friends can be used from other scripts
+# (and on CPU-only hosts). The models, optimizers and checkpoint are built the
+# first time they are needed; `main()` runs the actual training.
+#
+#   python pix2pixKT.py
 
 # In[1]:
 
@@ -63,16 +71,29 @@ from __future__ import absolute_import, division, print_function, unicode_litera
  # pass
 import tensorflow as tf
 
+import atexit
+import datetime
 import os
+import random
+import shutil
+import tempfile
 import time
+import zlib
 
-from matplotlib import pyplot as plt
-from IPython import display
 
-
-physical_devices = tf.config.experimental.list_physical_devices('GPU')
-assert len(physical_devices) > 0, "Not enough GPU hardware devices available"
-tf.config.experimental.set_memory_growth(physical_devices[0], True)
+def setup_devices(require_gpu=True, cpu_devices=0):
+  # cpu_devices > 1 splits the CPU into that many logical devices, to try out
+  # DISTRIBUTE = 'mirrored' without GPUs. Either has to happen before
+  # TensorFlow initializes its devices.
+  physical_devices = tf.config.experimental.list_physical_devices('GPU')
+  if require_gpu:
+    assert len(physical_devices) > 0, "Not enough GPU hardware devices available"
+  for device in physical_devices:
+    tf.config.experimental.set_memory_growth(device, True)
+  if cpu_devices > 1:
+    cpu = tf.config.list_physical_devices('CPU')[0]
+    tf.config.set_logical_device_configuration(
+        cpu, [tf.config.LogicalDeviceConfiguration()] * cpu_devices)
 
 
 # In[2]:
@@ -106,110 +127,73 @@ PATH = '/content/pix2pixUtils/dataSet/dataSet/'
 # In[4]:
 
 
-BUFFER_SIZE = 500
-BATCH_SIZE = 1
-IMG_WIDTH = 512
-IMG_HEIGHT = 512
-
-
-
-# In[5]:
-
-
-def load(image_file):
-  image = tf.io.read_file(image_file)
-  image = tf.image.decode_jpeg(image)
-
-  w = tf.shape(image)[1]
-
-  w = w // 2
-  real_image = image[:, :w, :]
-  input_image = image[:, w:, :]
-
-  input_image = tf.cast(input_image, tf.float32)
-  real_image = tf.cast(real_image, tf.float32)
-
-  return input_image, real_image
-
-
-# In[6]:
-
-
-inp, re = load(PATH+'train/00100.jpg')
-'''
-# casting to int for matplotlib to show the image
-plt.figure()
-plt.imshow(inp/255.0)
-plt.figure()
-plt.imshow(re/255.0)
-'''
-
-# In[7]:
-
-
-def resize(input_image, real_image, height, width):
-  input_image = tf.image.resize(input_image, [height, width],
-                                method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
-  real_image = tf.image.resize(real_image, [height, width],
-                               method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
-
-  return input_image, real_image
-
-
-# In[8]:
-
-
-def random_crop(input_image, real_image):
-  stacked_image = tf.stack([input_image, real_image], axis=0)
-  cropped_image = tf.image.random_crop(
-      stacked_image, size=[2, IMG_HEIGHT, IMG_WIDTH, 3])
-
-  return cropped_image[0], cropped_image[1]
-
-
-# In[9]:
-
-
-# normalizing the images to [-1, 1]
-
-def normalize(input_image, real_image):
-  input_image = (input_image / 127.5) - 1
-  real_image = (real_image / 127.5) - 1
-
-  return input_image, real_image
-
-
-# In[10]:
-
-
-@tf.function()
-def random_jitter(input_image, real_image):
-  # resizing to 286 x 286 x 3
-  input_image, real_image = resize(input_image, real_image, int(IMG_WIDTH*1.3), int(IMG_HEIGHT*1.3))
-
-  # randomly cropping to 256 x 256 x 3
-  input_image, real_image = random_crop(input_image, real_image)
-
-  if tf.random.uniform(()) > 0.5:
-    # random mirroring
-    input_image = tf.image.flip_left_right(input_image)
-    real_image = tf.image.flip_left_right(real_image)
-
-  return input_image, real_image
+# The input pipeline (and its BUFFER_SIZE, BATCH_SIZE, IMG_WIDTH and
+# IMG_HEIGHT settings) lives in pix2pix_data.py.
+from pix2pix_data import (BUFFER_SIZE, BATCH_SIZE, IMG_WIDTH, IMG_HEIGHT,
+                          load, resize, random_crop, normalize, random_jitter,
+                          normalize_uint8, load_image_train, load_image_test,
+                          make_train_dataset, make_test_dataset,
+                          cached_train_dataset, cached_test_dataset, make_eval_dataset)
+
+# Set this to the prefix passed to `python pix2pix_data.py ingest` to read
+# pre-decoded uint8 pairs instead of decoding every JPEG every epoch.
+CACHE_PATH = None #'/content/pix2pixUtils/cache/'
+
+# How training images are jittered:
+#  'per_example' - random_jitter, resize to 1.3x then crop, one example at a time
+#  'fused'       - fused_random_jitter, crops straight out of the uint8 source
+#  'batched'     - batch_random_jitter after `.batch()`, needs every training
+#                  image to be the same size
+JITTER_MODE = 'per_example'
+
+# Keep training images as uint8 through the pipeline (4x less memory per
+# element) and scale them to [-1, 1] at the start of train_step.
+UINT8_PIPELINE = False
+
+# Seed for a reproducible, deterministically ordered training pipeline; epoch
+# N is shuffled with PIPELINE_SEED + N. Training always needs one (see
+# make_datasets), without it a random seed is picked, and with 'multi_worker'
+# all workers use worker 0's. The seed is saved in the checkpoints and a
+# resumed run keeps using it.
+PIPELINE_SEED = None
+
+# The test set is decoded and resized once and kept in memory, or in this
+# file if it's set. It's evaluated in batches of EVAL_BATCH_SIZE.
+EVAL_CACHE_FILE = ''
+EVAL_BATCH_SIZE = 8
+
+# Mixed precision: None trains in float32, 'mixed_float16' (GPU) or
+# 'mixed_bfloat16' (TPU, recent CPUs) compute in 16 bits with float32 weights,
+# about halving activation memory so BATCH_SIZE can go above 1 at 512x512.
+# The optimizers are wrapped in a LossScaleOptimizer when LOSS_SCALING is set,
+# which float16 needs and bfloat16 doesn't.
+MIXED_PRECISION = None
+LOSS_SCALING = None  # None: only for 'mixed_float16'
+
+# Accumulate the gradients of this many batches before applying them, for an
+# effective batch of ACCUMULATION_STEPS * BATCH_SIZE in the memory of one
+# BATCH_SIZE batch. BatchNorm still normalizes over each BATCH_SIZE batch.
+ACCUMULATION_STEPS = 1
+
+# Data parallel training, every replica gets BATCH_SIZE images of a
+# BATCH_SIZE * replicas batch and the gradients are summed across them:
+#  None           - a single device
+#  'mirrored'     - every GPU on this host, or CPU_DEVICES logical CPUs
+#  'multi_worker' - every GPU or CPU of the hosts in the TF_CONFIG environment
+#                   variable, running this script once per host. Only worker 0
+#                   writes checkpoints, summaries and previews.
+DISTRIBUTE = None
+CPU_DEVICES = 0
 
 
 # As you can see in the images below
 # that they are going through random jittering
-# Random jittering as described in the paper is to
-# 
-# 1. Resize an image to bigger height and width
-# 2. Randomly crop to the target size
-# 3. Randomly flip the image horizontally
 
 # In[11]:
 
 '''
 
+inp, re = load(PATH+'train/00100.jpg')
 
 plt.figure(figsize=(6, 6))
 for i in range(4):
@@ -220,343 +204,230 @@ for i in range(4):
 plt.show()
 '''
 
-# In[12]:
-
-
-def load_image_train(image_file):
-  input_image, real_image = load(image_file)
-  input_image, real_image = random_jitter(input_image, real_image)
-  input_image, real_image = normalize(input_image, real_image)
-
-  return input_image, real_image
-
-
-# In[13]:
-
-
-def load_image_test(image_file):
-  input_image, real_image = load(image_file)
-  input_image, real_image = resize(input_image, real_image,
-                                   IMG_HEIGHT, IMG_WIDTH)
-  input_image, real_image = normalize(input_image, real_image)
-  
-   
-    
-  return input_image, real_image
-
 
 # ## Input Pipeline
 
 # In[14]:
 
 
-train_dataset = tf.data.Dataset.list_files(PATH+'train/*.jpg')
-train_dataset = train_dataset.map(load_image_train,
-                                  num_parallel_calls=tf.data.experimental.AUTOTUNE)
-train_dataset = train_dataset.shuffle(BUFFER_SIZE)
-train_dataset = train_dataset.batch(BATCH_SIZE)
-
-
-
-# In[15]:
-
-
-#to unrandomise the shuffle add false, this is if you want a running animation or something
-test_dataset = tf.data.Dataset.list_files(PATH+'test/*.jpg' )#, shuffle=False)
-test_dataset = test_dataset.map(load_image_test)
-test_dataset = test_dataset.batch(BATCH_SIZE)
-
-
-# ## Build the Generator
-#   * The architecture of generator is a modified U-Net.
-#   * Each block in the encoder is (Conv -> Batchnorm -> Leaky ReLU)
-#   * Each block in the decoder is (Transposed Conv -> Batchnorm -> Dropout(applied to the first 3 blocks) -> ReLU)
-#   * There are skip connections between the encoder and decoder (as in U-Net).
-# 
-# 
+# With 'multi_worker' every worker builds the whole training pipeline and
+# tf.distribute gives each of them every Nth batch of it (auto-sharding by
+# data: the JPEGs are read with map(read_file), not a file reader dataset, so
+# it can't shard by file). That only splits an epoch between the workers if
+# they all produce the batches in the same order, so they must share the
+# pipeline seed and the list of training files.
+
+def broadcast_from_first_replica(value):
+  # The int `value` of the first replica (on worker 0), on every worker.
+  strategy = get_strategy()
+  value = tf.constant(value, tf.int64)
+
+  def first_replica_only():
+    replica_id = tf.distribute.get_replica_context().replica_id_in_sync_group
+    return tf.where(tf.equal(replica_id, 0), value, tf.zeros_like(value))
+
+  return int(strategy.reduce(tf.distribute.ReduceOp.SUM, strategy.run(first_replica_only),
+                             axis=None))
+
+
+def pipeline_seed():
+  # PIPELINE_SEED, or without one a random seed. With 'multi_worker' it's
+  # worker 0's, on every worker.
+  global shared_seed
+  if shared_seed is None:
+    seed = PIPELINE_SEED if PIPELINE_SEED is not None else random.randrange(2**31)
+    if DISTRIBUTE == 'multi_worker':
+      seed = broadcast_from_first_replica(seed)
+    shared_seed = seed
+  return shared_seed
+
+
+def check_shared_input(file_pattern, seed):
+  # Raises on every worker unless all of them have the same seed and the same
+  # training files, so that their shards partition every epoch.
+  files = sorted(tf.io.gfile.glob(file_pattern))
+  fingerprint = zlib.crc32('\n'.join([str(seed)] + files).encode('utf-8'))
+  matches = int(fingerprint == broadcast_from_first_replica(fingerprint))
+  strategy = get_strategy()
+  mismatched = strategy.reduce(tf.distribute.ReduceOp.SUM,
+                               strategy.run(lambda: tf.constant(1 - matches, tf.int64)), axis=None)
+  if int(mismatched):
+    raise ValueError('The workers have different training files or pipeline seeds, their '
+                     'shards would not partition the dataset ({} files on this worker)'.format(
+                         len(files)))
+
+
+def make_datasets():
+  # Returns a function from the epoch number to that epoch's training
+  # dataset, and the test dataset.
+  #
+  # Every epoch gets a new training dataset, shuffled with seed + epoch. A
+  # seeded dataset reshuffles on every new iterator, so reusing one dataset
+  # would make an epoch's order depend on how many epochs this process has
+  # run, and a restarted job would go through epoch 0's order again. A
+  # resumed epoch skips the batches it had already trained on, which relies
+  # on getting the same order back. (Checkpointing the iterator instead would
+  # save the whole shuffle buffer of decoded images with every checkpoint.)
+  #
+  # The file names are shuffled over the whole dataset every epoch, so there is
+  # no shuffle buffer of decoded images.
+  replicas = get_strategy().num_replicas_in_sync
+  global_batch_size = BATCH_SIZE * replicas
+  if CACHE_PATH:
+    train_pattern = CACHE_PATH+'train-*.tfrecord'
+  else:
+    train_pattern = PATH+'train/*.jpg'
+  if DISTRIBUTE == 'multi_worker':
+    check_shared_input(train_pattern, pipeline_seed())
+
+  def train_dataset_fn(epoch):
+    # the checkpoint's seed, which a restored checkpoint may have changed; -1
+    # in checkpoints of unseeded runs, whose order can't be repeated
+    seed = int(get_checkpoint().pipeline_seed.numpy())
+    seed = None if seed < 0 else seed + epoch
+    if CACHE_PATH:
+      train_dataset = cached_train_dataset(train_pattern, batch_size=global_batch_size,
+                                           jitter=JITTER_MODE, keep_uint8=UINT8_PIPELINE,
+                                           seed=seed)
+    else:
+      train_dataset = make_train_dataset(train_pattern, batch_size=global_batch_size,
+                                         jitter=JITTER_MODE, keep_uint8=UINT8_PIPELINE,
+                                         seed=seed)
+    if replicas > 1:
+      # a short last batch would leave some replicas with no images
+      train_dataset = train_dataset.rebatch(global_batch_size, drop_remainder=True)
+    return train_dataset
+
+  # in a fixed order, for the previews and evaluation
+  if CACHE_PATH:
+    test_dataset = make_eval_dataset(CACHE_PATH+'test-*.tfrecord', EVAL_BATCH_SIZE,
+                                     EVAL_CACHE_FILE, from_cache=True)
+  else:
+    test_dataset = make_eval_dataset(PATH+'test/*.jpg', EVAL_BATCH_SIZE, EVAL_CACHE_FILE)
+
+  return train_dataset_fn, test_dataset
+
+
+# ## Build the Generator and Discriminator
+#
+# The models and losses live in pix2pix_model.py.
 
 # In[16]:
 
 
-OUTPUT_CHANNELS = 3
-
-
-# In[17]:
-
-
-def downsample(filters, size, apply_batchnorm=True):
-  initializer = tf.random_normal_initializer(0., 0.02)
-
-  result = tf.keras.Sequential()
-  result.add(
-      tf.keras.layers.Conv2D(filters, size, strides=2, padding='same',
-                             kernel_initializer=initializer, use_bias=False))
-
-  if apply_batchnorm:
-    result.add(tf.keras.layers.BatchNormalization())
-
-  result.add(tf.keras.layers.LeakyReLU())
-
-  return result
-
-
-# In[18]:
-
-
-down_model = downsample(3, 4)
-down_result = down_model(tf.expand_dims(inp, 0))
-print (down_result.shape)
-
-
-# In[19]:
-
-
-def upsample(filters, size, apply_dropout=False):
-  initializer = tf.random_normal_initializer(0., 0.02)
-
-  result = tf.keras.Sequential()
-  result.add(
-    tf.keras.layers.Conv2DTranspose(filters, size, strides=2,
-                                    padding='same',
-                                    kernel_initializer=initializer,
-                                    use_bias=False))
-
-  result.add(tf.keras.layers.BatchNormalization())
-
-  if apply_dropout:
-      result.add(tf.keras.layers.Dropout(0.5))
-
-  result.add(tf.keras.layers.ReLU())
-
-  return result
-
-
-# In[20]:
-
-
-up_model = upsample(3, 4)
-up_result = up_model(down_result)
-print (up_result.shape)
-
-
-# In[21]:
-
-
-def Generator():
-  inputs = tf.keras.layers.Input(shape=[IMG_WIDTH,IMG_HEIGHT,3])
-
-  down_stack = [
-   # downsample(16, 4, apply_batchnorm=False), # (bs, 512, 512, 64)  
-    downsample(32, 4, apply_batchnorm=False), # (bs, 512, 512, 32)
-    downsample(64, 4), # (bs, 128, 128, 16)
-    downsample(128, 4), # (bs, 64, 64, 8)
-    downsample(256, 4), # (bs, 32, 32, 4)
-    downsample(512, 4), # (bs, 16, 16, 2)
-    downsample(1024, 4), # (bs, 8, 8, 1)
-    downsample(1024, 4), # (bs, 4, 4, 512)
-    downsample(1024, 4), # (bs, 2, 2, 512)
-    downsample(1024, 4), # (bs, 1, 1, 512)
-   # downsample(1024, 4), # (bs, 1, 1, 512)
-    #downsample(2048, 4), # (bs, 1, 1, 512)
-  ]
-
-  up_stack = [
-    upsample(1024, 4, apply_dropout=True), # (bs, 2, 2, 1024)
-    upsample(1024, 4, apply_dropout=True), # (bs, 2, 4, 1024)
-    upsample(1024, 4, apply_dropout=True), # (bs, 2, 2, 1024)
-   # upsample(1024, 4), # (bs, 4, 4, 1024)
-    #upsample(1024, 4), # (bs, 8, 8, 1024)
-    upsample(512, 4), # (bs, 16, 16, 1024)
-    upsample(256, 4), # (bs, 32, 32, 512)
-    upsample(128, 4), # (bs, 64, 64, 256)
-    upsample(64, 4), # (bs, 128, 128, 128)
-    upsample(32, 4), # (bs, 128, 128, 128)
-    #upsample(16, 4), # (bs, 128, 128, 128)
-    
-  ]
-
-  initializer = tf.random_normal_initializer(0., 0.02)
-  last = tf.keras.layers.Conv2DTranspose(OUTPUT_CHANNELS, 4,
-                                         strides=2,
-                                         padding='same',
-                                         kernel_initializer=initializer,
-                                         activation='tanh') # (bs, 256, 256, 3)
-
-  x = inputs
-
-  # Downsampling through the model
-  skips = []
-  for down in down_stack:
-    x = down(x)
-    print(x)
-    skips.append(x)
-
-  skips = reversed(skips[:-1])
-
-  # Upsampling and establishing the skip connections
-  for up, skip in zip(up_stack, skips):
-    x = up(x)
-    x = tf.keras.layers.Concatenate()([x, skip])
-    print (x, skip)
-  x = last(x)
-
-
-
-  return tf.keras.Model(inputs=inputs, outputs=x)
-
-
-# In[22]:
-
-
-generator = Generator()
-tf.keras.utils.plot_model(generator, show_shapes=True, dpi=64)
-
-
-# In[23]:
+from pix2pix_model import (OUTPUT_CHANNELS, LAMBDA, downsample, upsample,
+                           Generator, Discriminator, loss_object,
+                           generator_loss, discriminator_loss,
+                           save_model_config, load_model_config)
 
 
-gen_output = generator(inp[tf.newaxis,...], training=True)
-plt.imshow(gen_output[0,...])
-
-
-# * **Generator loss**
-#   * It is a sigmoid cross entropy loss of the generated images and an **array of ones**.
-#   * The [paper](https://arxiv.org/abs/1611.07004) also includes L1 loss which is MAE (mean absolute error) between the generated image and the target image.
-#   * This allows the generated image to become structurally similar to the target image.
-#   * The formula to calculate the total generator loss = gan_loss + LAMBDA * l1_loss, where LAMBDA = 100. This value was decided by the authors of the [paper](https://arxiv.org/abs/1611.07004).
-
-# The training procedure for the generator is shown below:
-
-# In[24]:
-
-
-LAMBDA = 100
-
-
-# 
-
-# In[25]:
-
-
-def generator_loss(disc_generated_output, gen_output, target):
-  gan_loss = loss_object(tf.ones_like(disc_generated_output), disc_generated_output)
-
-  # mean absolute error
-  l1_loss = tf.reduce_mean(tf.abs(target - gen_output))
-
-  total_gen_loss = gan_loss + (LAMBDA * l1_loss)
-
-  return total_gen_loss, gan_loss, l1_loss
-
-
-# 
-# 
-# ![Generator Update Image](https://github.com/tensorflow/docs/blob/master/site/en/tutorials/generative/images/gen.png?raw=1)
-# 
-
-# ## Build the Discriminator
-#   * The Discriminator is a PatchGAN.
-#   * Each block in the discriminator is (Conv -> BatchNorm -> Leaky ReLU)
-#   * The shape of the output after the last layer is (batch_size, 30, 30, 1)
-#   * Each 30x30 patch of the output classifies a 70x70 portion of the input image (such an architecture is called a PatchGAN).
-#   * Discriminator receives 2 inputs.
-#     * Input image and the target image, which it should classify as real.
-#     * Input image and the generated image (output of generator), which it should classify as fake.
-#     * We concatenate these 2 inputs together in the code (`tf.concat([inp, tar], axis=-1)`)
-
-# In[26]:
-
-
-def Discriminator():
-  initializer = tf.random_normal_initializer(0., 0.02)
-
-  inp = tf.keras.layers.Input(shape=[IMG_WIDTH, IMG_HEIGHT, 3], name='input_image')
-  tar = tf.keras.layers.Input(shape=[IMG_WIDTH, IMG_HEIGHT, 3], name='target_image')
-
-  x = tf.keras.layers.concatenate([inp, tar]) # (bs, 256, 256, channels*2)
-
-  down1 = downsample(32, 4, False)(x) # (bs, 512, 512, 32)  
-  down2 = downsample(64, 4)(down1) # (bs, 128, 128, 64)
-  down3 = downsample(128, 4)(down2) # (bs, 64, 64, 128)
-  down4 = downsample(256, 4)(down3) # (bs, 32, 32, 256)
-  down5 = downsample(512, 4)(down4) # (bs, 32, 32, 256)
-
-  zero_pad1 = tf.keras.layers.ZeroPadding2D()(down4) # (bs, 34, 34, 256)
-  conv = tf.keras.layers.Conv2D(512, 4, strides=1,
-                                kernel_initializer=initializer,
-                                use_bias=False)(zero_pad1) # (bs, 31, 31, 512)
-
-  batchnorm1 = tf.keras.layers.BatchNormalization()(conv)
-
-  leaky_relu = tf.keras.layers.LeakyReLU()(batchnorm1)
-
-  zero_pad2 = tf.keras.layers.ZeroPadding2D()(leaky_relu) # (bs, 33, 33, 512)
-
-  last = tf.keras.layers.Conv2D(1, 4, strides=1,
-                                kernel_initializer=initializer)(zero_pad2) # (bs, 30, 30, 1)
-
-  return tf.keras.Model(inputs=[inp, tar], outputs=last)
-
-
-# In[27]:
-
-
-discriminator = Discriminator()
-tf.keras.utils.plot_model(discriminator, show_shapes=True, dpi=64)
-
-
-# In[28]:
-
-
-disc_out = discriminator([inp[tf.newaxis,...], gen_output], training=False)
-plt.imshow(disc_out[0,...,-1], vmin=-20, vmax=20, cmap='RdBu_r')
-plt.colorbar()
-
-
-# **Discriminator loss**
-#   * The discriminator loss function takes 2 inputs; **real images, generated images**
-#   * real_loss is a sigmoid cross entropy loss of the **real images** and an **array of ones(since these are the real images)**
-#   * generated_loss is a sigmoid cross entropy loss of the **generated images** and an **array of zeros(since these are the fake images)**
-#   * Then the total_loss is the sum of real_loss and the generated_loss
-# 
-
-# In[29]:
-
-
-loss_object = tf.keras.losses.BinaryCrossentropy(from_logits=True)
-
-
-# In[30]:
-
-
-def discriminator_loss(disc_real_output, disc_generated_output):
-  real_loss = loss_object(tf.ones_like(disc_real_output), disc_real_output)
-
-  generated_loss = loss_object(tf.zeros_like(disc_generated_output), disc_generated_output)
-
-  total_disc_loss = real_loss + generated_loss
-
-  return total_disc_loss
-
-
-# The training procedure for the discriminator is shown below.
-# 
-# To learn more about the architecture and the hyperparameters you can refer the [paper](https://arxiv.org/abs/1611.07004).
-
-# 
-# ![Discriminator Update Image](https://github.com/tensorflow/docs/blob/master/site/en/tutorials/generative/images/dis.png?raw=1)
-# 
-
 # ## Define the Optimizers and Checkpoint-saver
-# 
-# 
-# 
+#
+# Everything below is built on first use, so importing this file stays cheap.
 
 # In[31]:
 
 
-generator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
-discriminator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
+strategy = None
+shared_seed = None
+generator = None
+discriminator = None
+generator_optimizer = None
+discriminator_optimizer = None
+checkpoint = None
+checkpointer = None
+loss_logger = None
+preview_writer = None
+evaluator = None
+accumulated = None
+
+
+def set_precision_policy():
+  # Has to run before the models are built; their layers take the policy
+  # that is global at construction time.
+  if MIXED_PRECISION:
+    tf.keras.mixed_precision.set_global_policy(MIXED_PRECISION)
+
+
+def loss_scaling():
+  if LOSS_SCALING is None:
+    return MIXED_PRECISION == 'mixed_float16'
+  return LOSS_SCALING
+
+
+def get_strategy():
+  # With 'multi_worker' this has to be the first thing to touch TensorFlow
+  # after setup_devices, main() calls it straight away.
+  global strategy
+  if strategy is None:
+    if DISTRIBUTE == 'mirrored':
+      devices = None
+      if not tf.config.list_physical_devices('GPU'):
+        devices = [device.name for device in tf.config.list_logical_devices('CPU')]
+      strategy = tf.distribute.MirroredStrategy(devices)
+    elif DISTRIBUTE == 'multi_worker':
+      strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    elif DISTRIBUTE is None:
+      strategy = tf.distribute.get_strategy()
+    else:
+      raise ValueError("DISTRIBUTE must be None, 'mirrored' or 'multi_worker', "
+                       "got {!r}".format(DISTRIBUTE))
+  return strategy
+
+
+def is_chief():
+  # True on a single host, and on worker 0 (or the chief) of a multi worker run.
+  resolver = get_strategy().cluster_resolver
+  if resolver is None or not resolver.task_type:
+    return True
+  return (resolver.task_type == 'chief' or
+          (resolver.task_type == 'worker' and resolver.task_id == 0))
+
+
+# The models, optimizers and the other variables train_step updates are
+# created in the strategy's scope, so they are mirrored on every replica.
+#
+# GENERATOR_CONFIG and DISCRIMINATOR_CONFIG are keyword arguments for
+# Generator() and Discriminator() in pix2pix_model.py, e.g.
+# {'max_filters': 512} for a smaller generator; empty builds the models the
+# existing checkpoints were trained with. Their height and width must match
+# IMG_HEIGHT and IMG_WIDTH. fit() saves them next to the checkpoints, where
+# pix2pix_infer.py and pix2pix_export.py read them back.
+GENERATOR_CONFIG = {}
+DISCRIMINATOR_CONFIG = {}
+
+
+def get_generator():
+  global generator
+  if generator is None:
+    set_precision_policy()
+    with get_strategy().scope():
+      generator = Generator(**GENERATOR_CONFIG)
+  return generator
+
+
+def get_discriminator():
+  global discriminator
+  if discriminator is None:
+    set_precision_policy()
+    with get_strategy().scope():
+      discriminator = Discriminator(**DISCRIMINATOR_CONFIG)
+  return discriminator
+
+
+def get_optimizers():
+  global generator_optimizer, discriminator_optimizer
+  if generator_optimizer is None:
+    with get_strategy().scope():
+      generator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
+      discriminator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
+      if loss_scaling():
+        generator_optimizer = tf.keras.mixed_precision.LossScaleOptimizer(generator_optimizer)
+        discriminator_optimizer = tf.keras.mixed_precision.LossScaleOptimizer(discriminator_optimizer)
+      # the slot variables can't be created inside train_steps' loop
+      generator_optimizer.build(get_generator().trainable_variables)
+      discriminator_optimizer.build(get_discriminator().trainable_variables)
+  return generator_optimizer, discriminator_optimizer
 
 
 # In[32]:
@@ -564,10 +435,60 @@ discriminator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
 
 checkpoint_dir = '/content/drive/MyDrive/checkPoints'
 checkpoint_prefix = os.path.join(checkpoint_dir, "ckpt")
-checkpoint = tf.train.Checkpoint(generator_optimizer=generator_optimizer,
-                                 discriminator_optimizer=discriminator_optimizer,
-                                 generator=generator,
-                                 discriminator=discriminator)
+
+
+def get_checkpoint():
+  global checkpoint
+  if checkpoint is None:
+    generator_optimizer, discriminator_optimizer = get_optimizers()
+    seed = pipeline_seed()
+    with get_strategy().scope():
+      epoch = tf.Variable(0, dtype=tf.int64, trainable=False, name='epoch')
+      epoch_step = tf.Variable(0, dtype=tf.int64, trainable=False, name='epoch_step')
+      seed = tf.Variable(seed, dtype=tf.int64, trainable=False, name='pipeline_seed')
+    checkpoint = tf.train.Checkpoint(generator_optimizer=generator_optimizer,
+                                     discriminator_optimizer=discriminator_optimizer,
+                                     generator=get_generator(),
+                                     discriminator=get_discriminator(),
+                                     step=get_loss_logger().step,
+                                     epoch=epoch,
+                                     epoch_step=epoch_step,
+                                     pipeline_seed=seed)
+  return checkpoint
+
+
+# Checkpoints are written in the background, see pix2pix_checkpoint.py, every
+# CHECKPOINT_EVERY_N_EPOCHS epochs and, if it is set, every
+# CHECKPOINT_EVERY_N_STEPS training steps. Only the newest
+# CHECKPOINT_MAX_TO_KEEP are kept. CHECKPOINT_STAGING_DIR is where they are
+# written before the upload; None picks /dev/shm if it has room, else the
+# local temporary directory.
+CHECKPOINT_EVERY_N_EPOCHS = 5
+CHECKPOINT_EVERY_N_STEPS = None
+CHECKPOINT_MAX_TO_KEEP = 5
+CHECKPOINT_STAGING_DIR = None
+
+
+from pix2pix_checkpoint import AsyncCheckpointer, latest_complete_checkpoint
+
+
+def get_checkpointer():
+  # Every worker has to take part in saving, but only the chief writes to
+  # checkpoint_dir; the others save to a local temporary directory that keeps
+  # only their latest copy and is deleted when the process exits.
+  global checkpointer
+  if checkpointer is None:
+    directory = checkpoint_dir
+    max_to_keep = CHECKPOINT_MAX_TO_KEEP
+    if not is_chief():
+      directory = tempfile.mkdtemp(prefix='pix2pix_worker_checkpoint_')
+      atexit.register(shutil.rmtree, directory, True)
+      max_to_keep = 1
+    checkpointer = AsyncCheckpointer(get_checkpoint(), directory, max_to_keep,
+                                     step=get_loss_logger().step,
+                                     every_n_steps=CHECKPOINT_EVERY_N_STEPS,
+                                     staging_dir=CHECKPOINT_STAGING_DIR)
+  return checkpointer
 
 
 # ## Generate Images
@@ -587,7 +508,13 @@ checkpoint = tf.train.Checkpoint(generator_optimizer=generator_optimizer,
 # In[33]:
 
 
+generate_dir = '/content/drive/MyDrive/checkPoints/generateImage/'
+
+
 def generate_images(model, test_input, tar, num):
+  # matplotlib is only needed for these previews, not to import this file
+  from matplotlib import pyplot as plt
+
   prediction = model(test_input, training=True)
   plt.figure(figsize=(15,15))
 
@@ -601,23 +528,33 @@ def generate_images(model, test_input, tar, num):
     plt.imshow(display_list[i] * 0.5 + 0.5)
     plt.axis('off')
     
-  savePath = '/content/drive/MyDrive/checkPoints/generateImage/'+str(num)+'.png'
+  savePath = generate_dir+str(num)+'.png'
   plt.savefig(savePath)  
   #plt.show()
+  plt.close()
 
-  
 
+# During training the previews come from a PreviewWriter instead: the same
+# PREVIEW_COUNT test examples every time, written to generate_dir as
+# <global step>.png grids (input | ground truth | prediction) by a background
+# thread, at the start of every epoch and every PREVIEW_EVERY_N_STEPS steps
+# if that is set.
 
-# In[34]:
-import glob
+PREVIEW_COUNT = 4
+PREVIEW_EVERY_N_STEPS = None
 
-genNum = len(glob.glob('/content/drive/MyDrive/checkPoints/generateImage/*.png'))
 
-for example_input, example_target in test_dataset.take(1):
-  generate_images(generator, example_input, example_target, genNum)
-  genNum+=1
+from pix2pix_preview import PreviewWriter, take_examples
 
 
+def get_preview_writer(test_ds):
+  global preview_writer
+  if preview_writer is None:
+    inputs, targets = take_examples(test_ds, PREVIEW_COUNT)
+    preview_writer = PreviewWriter(get_generator(), inputs, targets, generate_dir,
+                                   every_n_steps=PREVIEW_EVERY_N_STEPS)
+  return preview_writer
+
 
 # ## Training
 # 
@@ -636,18 +573,101 @@ EPOCHS = 60
 # In[36]:
 
 
-import datetime
 log_dir="/content/drive/MyDrive/checkPoints/logs/"
 
-summary_writer = tf.summary.create_file_writer(
-  log_dir + "fit/" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+# The losses are averaged on the device and written to TensorBoard every
+# SUMMARY_EVERY_N_STEPS steps by a background thread (see pix2pix_metrics.py).
+SUMMARY_EVERY_N_STEPS = 100
+SUMMARY_FLUSH_SECS = 30
+
+# Training steps run per call of the compiled train_steps loop, and how often
+# the progress line is printed.
+STEPS_PER_CALL = 20
+PROGRESS_EVERY_SECS = 30
+
+
+# L1, PSNR and SSIM on the whole test set with training=False, logged with
+# the losses; None turns it off.
+EVAL_EVERY_N_STEPS = 1000
+
+
+from pix2pix_metrics import LossLogger, ProgressReporter, Evaluator
+
+
+def get_loss_logger():
+  global loss_logger
+  if loss_logger is None:
+    run_dir = log_dir + "fit/" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    with get_strategy().scope():
+      loss_logger = LossLogger(run_dir if is_chief() else None,
+                               every_n_steps=SUMMARY_EVERY_N_STEPS,
+                               flush_secs=SUMMARY_FLUSH_SECS)
+  return loss_logger
+
+
+def get_evaluator(test_ds):
+  global evaluator
+  if evaluator is None:
+    evaluator = Evaluator(get_generator(), test_ds, get_loss_logger().writer,
+                          every_n_steps=EVAL_EVERY_N_STEPS)
+  return evaluator
 
 
 # In[37]:
 
 
-@tf.function
-def train_step(input_image, target, epoch):
+def get_accumulated():
+  # Running sums of the generator and discriminator gradients, and how many
+  # batches have been added to them. The weights are float32 under every
+  # precision policy, and so are their gradients. Each replica keeps its own
+  # sums (ON_READ), they are only summed across replicas when applied.
+  global accumulated
+  if accumulated is None:
+    def zeros(variables):
+      return [tf.Variable(tf.zeros_like(v), trainable=False,
+                          synchronization=tf.VariableSynchronization.ON_READ,
+                          aggregation=tf.VariableAggregation.SUM)
+              for v in variables]
+    with get_strategy().scope():
+      accumulated = (zeros(get_generator().trainable_variables),
+                     zeros(get_discriminator().trainable_variables),
+                     tf.Variable(0, trainable=False, name='accumulated_batches'))
+  return accumulated
+
+
+def accumulate_gradients(generator_gradients, discriminator_gradients):
+  # Adds one batch's gradients to this replica's sums.
+  generator_sums, discriminator_sums, _ = get_accumulated()
+  for total, gradient in zip(generator_sums + discriminator_sums,
+                             generator_gradients + discriminator_gradients):
+    total.assign_add(gradient)
+
+
+def apply_accumulated():
+  # Applies the mean of the accumulated gradients and clears the sums.
+  generator = get_generator()
+  discriminator = get_discriminator()
+  generator_optimizer, discriminator_optimizer = get_optimizers()
+  generator_sums, discriminator_sums, _ = get_accumulated()
+
+  scale = 1. / ACCUMULATION_STEPS
+  generator_optimizer.apply_gradients(zip([total * scale for total in generator_sums],
+                                          generator.trainable_variables))
+  discriminator_optimizer.apply_gradients(zip([total * scale for total in discriminator_sums],
+                                              discriminator.trainable_variables))
+  for total in generator_sums + discriminator_sums:
+    total.assign(tf.zeros_like(total))
+
+
+def train_step_body(input_image, target):
+  generator = get_generator()
+  discriminator = get_discriminator()
+  generator_optimizer, discriminator_optimizer = get_optimizers()
+
+  if input_image.dtype == tf.uint8:
+    # UINT8_PIPELINE: scale to [-1, 1] here, on the device
+    input_image, target = normalize_uint8(input_image, target)
+
   with tf.GradientTape() as gen_tape, tf.GradientTape() as disc_tape:
     gen_output = generator(input_image, training=True)
 
@@ -657,58 +677,169 @@ def train_step(input_image, target, epoch):
     gen_total_loss, gen_gan_loss, gen_l1_loss = generator_loss(disc_generated_output, gen_output, target)
     disc_loss = discriminator_loss(disc_real_output, disc_generated_output)
 
-  generator_gradients = gen_tape.gradient(gen_total_loss,
+    # The optimizers sum the gradients of all the replicas, dividing by the
+    # number of replicas makes that the gradient of the mean loss.
+    # scale_loss is the identity unless the optimizers are LossScaleOptimizers,
+    # whose apply_gradients unscales the gradients and skips the update when
+    # they overflowed.
+    replicas = get_strategy().num_replicas_in_sync
+    scaled_gen_loss = generator_optimizer.scale_loss(gen_total_loss / replicas)
+    scaled_disc_loss = discriminator_optimizer.scale_loss(disc_loss / replicas)
+
+  generator_gradients = gen_tape.gradient(scaled_gen_loss,
                                           generator.trainable_variables)
-  discriminator_gradients = disc_tape.gradient(disc_loss,
+  discriminator_gradients = disc_tape.gradient(scaled_disc_loss,
                                                discriminator.trainable_variables)
 
-  generator_optimizer.apply_gradients(zip(generator_gradients,
-                                          generator.trainable_variables))
-  discriminator_optimizer.apply_gradients(zip(discriminator_gradients,
-                                              discriminator.trainable_variables))
+  if ACCUMULATION_STEPS > 1:
+    accumulate_gradients(generator_gradients, discriminator_gradients)
+  else:
+    generator_optimizer.apply_gradients(zip(generator_gradients,
+                                            generator.trainable_variables))
+    discriminator_optimizer.apply_gradients(zip(discriminator_gradients,
+                                                discriminator.trainable_variables))
+
+  get_loss_logger().update(gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss)
+
 
-  with summary_writer.as_default():
-    tf.summary.scalar('gen_total_loss', gen_total_loss, step=epoch)
-    tf.summary.scalar('gen_gan_loss', gen_gan_loss, step=epoch)
-    tf.summary.scalar('gen_l1_loss', gen_l1_loss, step=epoch)
-    tf.summary.scalar('disc_loss', disc_loss, step=epoch)
+def distributed_train_step(input_image, target):
+  # One train_step_body per replica. With ACCUMULATION_STEPS > 1 every Nth
+  # call also applies the accumulated gradients; that is decided out here,
+  # outside the replicas, since the gradients are summed across them in a
+  # tf.cond that all the replicas have to enter together. It all still runs
+  # in the compiled step.
+  strategy = get_strategy()
+  strategy.run(train_step_body, args=(input_image, target))
+  if ACCUMULATION_STEPS > 1:
+    batches = get_accumulated()[2]
+    batches.assign_add(1)
+    if batches % ACCUMULATION_STEPS == 0:
+      strategy.run(apply_accumulated)
+
+
+@tf.function
+def train_step(input_image, target):
+  distributed_train_step(input_image, target)
+
+
+# train_steps runs up to `steps` training steps from a dataset iterator inside
+# one compiled loop, which saves the Python and dispatch overhead of calling
+# train_step once per batch. It returns how many steps and images it ran,
+# fewer than asked for when the iterator runs out. Distributed, `iterator` is
+# over get_strategy().experimental_distribute_dataset() and the image count is
+# this worker's.
+
+@tf.function
+def train_steps(iterator, steps):
+  strategy = get_strategy()
+  images = tf.constant(0)
+  done = tf.constant(0)
+  for _ in tf.range(steps):
+    batch = iterator.get_next_as_optional()
+    if not batch.has_value():
+      break
+    input_image, target = batch.get_value()
+    distributed_train_step(input_image, target)
+    for local_images in strategy.experimental_local_results(input_image):
+      images += tf.shape(local_images)[0]
+    done += 1
+  return done, images
 
 
 # The actual training loop:
 # 
-# * Iterates over the number of epochs.
-# * On each epoch it clears the display, and runs `generate_images` to show it's progress.
-# * On each epoch it iterates over the training dataset, printing a '.' for each example.
-# * It saves a checkpoint every 20 epochs.
+# * Resumes from the latest checkpoint, down to the batch it stopped at, then iterates over the remaining epochs.
+# * On each epoch it clears the display, and writes a preview to show it's progress.
+# * On each epoch it iterates over the training dataset, STEPS_PER_CALL steps at a time, printing progress every PROGRESS_EVERY_SECS.
+# * It saves a checkpoint every CHECKPOINT_EVERY_N_EPOCHS epochs (and every CHECKPOINT_EVERY_N_STEPS steps), written in the background while training goes on.
 
 # In[38]:
 
 
-def fit(train_ds, epochs, test_ds):
-  for epoch in range(epochs):
+def fit(train_dataset_fn, epochs, test_ds):
+  # train_dataset_fn(epoch) returns the training dataset of that epoch, see
+  # make_datasets.
+  try:
+    from IPython import display
+  except ImportError:
+    display = None
+
+  # build the models, optimizers, loss logger and gradient sums before
+  # train_step is traced
+  checkpointer = get_checkpointer()
+  loss_logger = get_loss_logger()
+  if ACCUMULATION_STEPS > 1:
+    get_accumulated()
+  previews = get_preview_writer(test_ds) if is_chief() else None
+  evaluations = get_evaluator(test_ds) if is_chief() else None
+
+  # Resume from the latest checkpoint: the models and optimizers, the global
+  # step, the pipeline seed, the epoch and the batch the epoch had got to.
+  # The batches the epoch had already trained on are skipped; the epoch's
+  # dataset is seeded, so they are the same batches. The random jitter isn't,
+  # so after a restart the jitter is different, but not which images come
+  # next.
+  latest = latest_complete_checkpoint(checkpoint_dir)
+  config = load_model_config(checkpoint_dir)
+  if latest and (config['generator'] != GENERATOR_CONFIG or
+                 config['discriminator'] != DISCRIMINATOR_CONFIG):
+    raise ValueError('The checkpoints in {} were trained with GENERATOR_CONFIG = {} and '
+                     'DISCRIMINATOR_CONFIG = {}'.format(checkpoint_dir, config['generator'],
+                                                        config['discriminator']))
+  if is_chief():
+    save_model_config(checkpoint_dir, GENERATOR_CONFIG, DISCRIMINATOR_CONFIG)
+  if latest:
+    checkpointer.restore(latest)
+    print('Resuming from {} at epoch {}, step {} of the epoch'.format(
+        latest, int(get_checkpoint().epoch.numpy()), int(get_checkpoint().epoch_step.numpy())))
+  train_ds = train_dataset_fn(int(get_checkpoint().epoch.numpy()))
+  train_ds = train_ds.skip(int(get_checkpoint().epoch_step.numpy()))
+  iterator = iter(get_strategy().experimental_distribute_dataset(train_ds))
+
+  for epoch in range(int(get_checkpoint().epoch.numpy()), epochs):
     start = time.time()
 
-    display.clear_output(wait=True)
+    if display is not None:
+      display.clear_output(wait=True)
 
-    for example_input, example_target in test_ds.take(1):
-      generate_images(generator, example_input, example_target,epoch)
+    if previews is not None:
+      previews.write(int(loss_logger.step.numpy()))
     print("Epoch: ", epoch)
 
     # Train
-    for n, (input_image, target) in train_ds.enumerate():
-      print('.', end='')
-      if (n+1) % 100 == 0:
-        print()
-      train_step(input_image, target, epoch)
-    print()
-
-    # saving (checkpoint) the model every 20 epochs
-    if (epoch + 1) % 5 == 0:
-      checkpoint.save(file_prefix = checkpoint_prefix)
+    progress = ProgressReporter(PROGRESS_EVERY_SECS)
+    steps_per_call = tf.constant(STEPS_PER_CALL)
+    while True:
+      steps, images = train_steps(iterator, steps_per_call)
+      steps = int(steps)
+      get_checkpoint().epoch_step.assign_add(steps)
+      loss_logger.maybe_write(steps)
+      checkpointer.maybe_save()
+      if is_chief():
+        step = int(loss_logger.step.numpy())
+        previews.maybe_write(step)
+        evaluations.maybe_evaluate(step)
+      progress.update(steps, int(images))
+      if steps < STEPS_PER_CALL:
+        break
+    progress.done()
+    loss_logger.flush()
+
+    # a checkpoint from here on starts the next epoch from its beginning
+    get_checkpoint().epoch.assign(epoch + 1)
+    get_checkpoint().epoch_step.assign(0)
+    iterator = iter(get_strategy().experimental_distribute_dataset(train_dataset_fn(epoch + 1)))
+
+    # saving (checkpoint) the model every CHECKPOINT_EVERY_N_EPOCHS epochs
+    if (epoch + 1) % CHECKPOINT_EVERY_N_EPOCHS == 0:
+      checkpointer.save()
 
     print ('Time taken for epoch {} is {} sec\n'.format(epoch + 1,
                                                         time.time()-start))
-  checkpoint.save(file_prefix = checkpoint_prefix)
+  checkpointer.save()
+  checkpointer.wait()
+  if previews is not None:
+    previews.wait()
 
 
 # This training loop saves logs you can easily view in TensorBoard to monitor the training progress. Working locally you would launch a separate tensorboard process. In a notebook, if you want to monitor with TensorBoard it's easiest to launch the viewer before starting the training.
@@ -729,14 +860,44 @@ def fit(train_ds, epochs, test_ds):
 # In[1]:
 
 
+# After training the generator is exported for serving (see
+# pix2pix_export.py): a SavedModel taking and returning uint8 images, plus
+# any of the TFLite variants in EXPORT_TFLITE ('float', 'dynamic', 'int8').
+# int8 is calibrated on EXPORT_CALIBRATION_IMAGES images from train_dataset,
+# and the quantized variants are compared with the float model on the test
+# set.
+EXPORT_DIR = '/content/drive/MyDrive/checkPoints/export'
+EXPORT_TFLITE = ()
+EXPORT_CALIBRATION_IMAGES = 64
+
+from pix2pix_export import (export_generator, calibration_images, quantization_report,
+                            print_quantization_report)
+
 
-# restoring the latest checkpoint in checkpoint_dir
-checkpoint.restore(tf.train.latest_checkpoint(checkpoint_dir))
+def main():
+  setup_devices(require_gpu=not CPU_DEVICES, cpu_devices=CPU_DEVICES)
+  get_strategy()
+
+  train_dataset_fn, test_dataset = make_datasets()
+
+  # fit() restores the latest checkpoint in checkpoint_dir
+  fit(train_dataset_fn, EPOCHS, test_dataset)
+
+  if is_chief():
+    calibration = None
+    if 'int8' in EXPORT_TFLITE:
+      calibration = calibration_images(train_dataset_fn(0), EXPORT_CALIBRATION_IMAGES)
+    paths = export_generator(get_generator(), EXPORT_DIR, EXPORT_TFLITE, calibration)
+    for variant, path in paths.items():
+      print('Exported', variant, path)
+    if EXPORT_TFLITE:
+      print_quantization_report(quantization_report(paths, test_dataset))
+
+
+if __name__ == '__main__':
+  main()
 
-fit(train_dataset, EPOCHS, test_dataset)
 
-generator.save(/content/drive/MyDrive/checkPoints/savedModel/my_xRay_model);
-generator.save(/content/drive/MyDrive/checkPoints/h5/myXrayModel.h5);
 # If you want to share the TensorBoard results _publicly_ you can upload the logs to [TensorBoard.dev](https://tensorboard.dev/) by copying the following into a code-cell.
 # 
 # Note: This requires a Google account.
@@ -756,10 +917,10 @@ generator.save(/content/drive/MyDrive/checkPoints/h5/myXrayModel.h5);
 # In[ ]:
 
 
-display.IFrame(
-    src="https://tensorboard.dev/experiment/lZ0C6FONROaUMfjYkVyJqw",
-    width="100%",
-    height="1000px")
+#display.IFrame(
+#    src="https://tensorboard.dev/experiment/lZ0C6FONROaUMfjYkVyJqw",
+#    width="100%",
+#    height="1000px")
 
 
 # Interpreting the logs from a GAN is more subtle than a simple classification or regression model. Things to look for::
@@ -775,4 +936,3 @@ display.IFrame(
 
 
 
-
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Input pipeline benchmark for pix2pix.
+#
+# Builds train_dataset / test_dataset with the same builders pix2pixKT.py uses
+# and reports images/sec for the whole pipeline, plus the latency each stage
+# (shuffle, load, random_jitter, batch, normalize) adds per image. The test
+# set is cached after its first pass, as in training, so its images/sec is
+# the rate of the later passes while its stage latencies are those of a first
+# pass. The benchmark runs on the CPU only, on synthetic side by side JPEGs it
+# writes to a temporary directory, and sweeps num_parallel_calls, BATCH_SIZE
+# and the image size:
+#
+#   python pix2pix_benchmark.py --sizes 256,512 --batch-sizes 1,4 \
+#       --parallel-calls 1,4,-1 --output bench_output.json
+#
+# -1 stands for tf.data.experimental.AUTOTUNE.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import tensorflow as tf
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import pix2pix_data
+
+
+def write_synthetic_pairs(directory, count, height, width):
+  # `count` random side by side JPEGs of 2*width x height.
+  os.makedirs(directory, exist_ok=True)
+  for i in range(count):
+    image = tf.random.uniform([height, 2 * width, 3], maxval=256, dtype=tf.int32)
+    image = tf.image.encode_jpeg(tf.cast(image, tf.uint8))
+    tf.io.write_file(os.path.join(directory, '{:05d}.jpg'.format(i)), image)
+  return os.path.join(directory, '*.jpg')
+
+
+def time_dataset(dataset, warmup=1):
+  # Iterates once over `dataset` and returns (images, seconds), not counting
+  # the first `warmup` elements (tracing, thread pool start up).
+  iterator = iter(dataset)
+  for _ in range(warmup):
+    next(iterator, None)
+
+  images = 0
+  start = time.perf_counter()
+  for element in iterator:
+    first = tf.nest.flatten(element)[0]
+    images += first.shape[0] if first.shape.rank == 4 else 1
+  return images, time.perf_counter() - start
+
+
+def stage_latencies(stages, warmup=1, repeats=5):
+  # Milliseconds per image each stage adds: the difference between the
+  # median times of successive prefixes of `stages`, each built afresh and
+  # timed `repeats` times. A stage that costs less than the noise comes out
+  # as 0 rather than negative.
+  latencies = []
+  previous = 0.0
+  for n in range(1, len(stages) + 1):
+    per_image = []
+    for _ in range(repeats):
+      images, seconds = time_dataset(pix2pix_data.apply_stages(stages[:n]), warmup)
+      per_image.append(1000.0 * seconds / max(images, 1))
+    median = float(np.median(per_image))
+    latencies.append({'stage': stages[n - 1][0], 'ms_per_image': max(median - previous, 0.0)})
+    previous = max(median, previous)
+  return latencies
+
+
+def run_benchmark(sizes, batch_sizes, parallel_calls, num_images=32, jitter='per_example',
+                  keep_uint8=False, repeats=2, latency_repeats=5, work_dir=None):
+  results = []
+  cleanup = work_dir is None
+  work_dir = work_dir or tempfile.mkdtemp(prefix='pix2pix_benchmark_')
+
+  try:
+    for size in sizes:
+      pix2pix_data.set_image_size(size, size)
+      train_pattern = write_synthetic_pairs(os.path.join(work_dir, str(size), 'train'),
+                                            num_images, size, size)
+      test_pattern = write_synthetic_pairs(os.path.join(work_dir, str(size), 'test'),
+                                           num_images, size, size)
+
+      for batch_size in batch_sizes:
+        # per stage latency is measured sequentially, independent of the sweep
+        train_latency = stage_latencies(pix2pix_data.train_stages(
+            train_pattern, batch_size, jitter, keep_uint8, num_parallel_calls=None),
+            repeats=latency_repeats)
+        test_latency = stage_latencies(pix2pix_data.eval_stages(
+            test_pattern, batch_size, num_parallel_calls=None), repeats=latency_repeats)
+
+        for calls in parallel_calls:
+          calls = tf.data.experimental.AUTOTUNE if calls == -1 else calls
+          train_dataset = pix2pix_data.make_train_dataset(
+              train_pattern, batch_size, jitter, keep_uint8, num_parallel_calls=calls)
+          test_dataset = pix2pix_data.make_eval_dataset(
+              test_pattern, batch_size, num_parallel_calls=calls)
+
+          # the evaluation set is always normalized
+          for name, dataset, latency, uint8 in [
+              ('train', train_dataset, train_latency, keep_uint8),
+              ('test', test_dataset, test_latency, False)]:
+            rates = []
+            for _ in range(repeats):
+              images, seconds = time_dataset(dataset)
+              rates.append(images / seconds if seconds > 0 else 0.0)
+
+            result = {
+              'dataset': name,
+              'img_height': size,
+              'img_width': size,
+              'batch_size': batch_size,
+              'num_parallel_calls': 'AUTOTUNE' if calls == tf.data.experimental.AUTOTUNE else calls,
+              'jitter': jitter,
+              'keep_uint8': uint8,
+              'images_per_sec': max(rates),
+              'stage_latency': latency,
+            }
+            results.append(result)
+            print('{dataset:5s} {img_width}x{img_height} batch {batch_size} '
+                  'num_parallel_calls {num_parallel_calls}: {images_per_sec:.1f} images/sec'
+                  .format(**result))
+  finally:
+    if cleanup:
+      shutil.rmtree(work_dir, ignore_errors=True)
+
+  return results
+
+
+def int_list(value):
+  return [int(v) for v in value.split(',')]
+
+
+def main():
+  parser = argparse.ArgumentParser(description='pix2pix input pipeline benchmark')
+  parser.add_argument('--sizes', type=int_list, default=[256, 512],
+                      help='comma separated IMG_WIDTH = IMG_HEIGHT values')
+  parser.add_argument('--batch-sizes', type=int_list, default=[1, 4])
+  parser.add_argument('--parallel-calls', type=int_list, default=[1, 4, -1],
+                      help='num_parallel_calls values, -1 for AUTOTUNE')
+  parser.add_argument('--num-images', type=int, default=32,
+                      help='synthetic train and test pairs per size, more than the batch size')
+  parser.add_argument('--jitter', choices=pix2pix_data.JITTER_MODES, default='per_example')
+  parser.add_argument('--keep-uint8', action='store_true')
+  parser.add_argument('--repeats', type=int, default=2)
+  parser.add_argument('--latency-repeats', type=int, default=5,
+                      help='timings per pipeline prefix, the stage latencies use the median')
+  parser.add_argument('--output', default='bench_output.json')
+  args = parser.parse_args()
+
+  tf.config.set_visible_devices([], 'GPU')
+
+  results = run_benchmark(args.sizes, args.batch_sizes, args.parallel_calls,
+                          args.num_images, args.jitter, args.keep_uint8, args.repeats,
+                          args.latency_repeats)
+
+  report = {
+    'date': datetime.datetime.now().isoformat(),
+    'tensorflow': tf.__version__,
+    'platform': platform.platform(),
+    'cpu_count': os.cpu_count(),
+    'results': results,
+  }
+  with open(args.output, 'w') as f:
+    json.dump(report, f, indent=2)
+  print('Wrote', args.output)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Non-blocking checkpointing for pix2pix training.
+#
+# checkpoint.save() straight into checkpoint_dir, a slow network mounted Drive
+# folder in our case, stalls training for the whole upload. AsyncCheckpointer
+# instead writes the checkpoint to a staging directory in host memory
+# (/dev/shm where there is one with enough room, the local temporary
+# directory otherwise), which only takes as long as copying the variables off
+# the device, and a background thread moves it to the checkpoint directory
+# while training carries on.
+#
+# Checkpoints can be taken every N steps as well as every N epochs, only the
+# newest `max_to_keep` are kept, and each one gets a `.complete` marker file
+# once all of its files are in place, so a checkpoint that was cut off half
+# way through the upload is never restored.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import tensorflow as tf
+
+import concurrent.futures
+import os
+import shutil
+import tempfile
+
+
+COMPLETE_SUFFIX = '.complete'
+
+
+def is_complete(checkpoint_path):
+  return tf.io.gfile.exists(checkpoint_path + COMPLETE_SUFFIX)
+
+
+def latest_complete_checkpoint(directory):
+  # The newest checkpoint in `directory` that has a completion marker, or
+  # None. A directory with no markers at all was written before they existed,
+  # and its latest checkpoint is used as is.
+  state = tf.train.get_checkpoint_state(directory)
+  if state is None:
+    return None
+  paths = list(state.all_model_checkpoint_paths) or [state.model_checkpoint_path]
+  if not any(is_complete(path) for path in paths):
+    return tf.train.latest_checkpoint(directory)
+  for path in reversed(paths):
+    if is_complete(path):
+      return path
+  return None
+
+
+def checkpoint_files(checkpoint_path):
+  # data shards first, so the .index only shows up once they're all there
+  return (sorted(tf.io.gfile.glob(checkpoint_path + '.data-*')) +
+          [checkpoint_path + '.index'])
+
+
+def checkpoint_size(checkpoint_path):
+  return sum(tf.io.gfile.stat(path).length for path in checkpoint_files(checkpoint_path)
+             if tf.io.gfile.exists(path))
+
+
+def default_staging_dir(required_bytes=0):
+  # /dev/shm, a RAM backed file system, so staging is a copy into host
+  # memory. It is often small (64 MB in a default Docker container), so
+  # without room for `required_bytes` this is None, the local temporary
+  # directory.
+  if os.path.isdir('/dev/shm') and shutil.disk_usage('/dev/shm').free > required_bytes:
+    return '/dev/shm'
+  return None
+
+
+class AsyncCheckpointer(object):
+  # Saves `checkpoint` to `directory` as ckpt-<number>, numbered by `step`,
+  # a step counter variable, or by the checkpoint's save counter when there
+  # is none. With `every_n_steps` maybe_save() saves when that many steps
+  # have passed since the last checkpoint. One checkpoint is uploaded at a
+  # time; a save that comes while the previous one is still uploading waits
+  # for it, which bounds the staging memory to one checkpoint.
+
+  def __init__(self, checkpoint, directory, max_to_keep=5, step=None, every_n_steps=None,
+               staging_dir=None):
+    self.checkpoint = checkpoint
+    self.directory = directory
+    self.max_to_keep = max_to_keep
+    self.step = step
+    self.every_n_steps = every_n_steps if step is not None else None
+    self.staging_dir = staging_dir
+
+    tf.io.gfile.makedirs(directory)
+    state = tf.train.get_checkpoint_state(directory)
+    self.checkpoints = list(state.all_model_checkpoint_paths) if state else []
+    self.last_step = self.current_step()
+
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self.pending = None
+
+  def current_step(self):
+    return None if self.step is None else int(self.step.numpy())
+
+  def restore(self, checkpoint_path):
+    # Restores `checkpoint_path` (None does nothing), and counts the step
+    # interval from the restored step.
+    status = self.checkpoint.restore(checkpoint_path)
+    self.last_step = self.current_step()
+    return status
+
+  def maybe_save(self):
+    # Called by the training loop as often as it likes; saves once the step
+    # interval has passed. Returns the new checkpoint's path or None.
+    if self.every_n_steps is None:
+      return None
+    if self.current_step() - self.last_step < self.every_n_steps:
+      return None
+    return self.save()
+
+  def save(self):
+    # Saves now, unless this step was already saved. Returns the path the
+    # checkpoint will have once it's uploaded, or None.
+    step = self.current_step()
+    if step is not None and step == self.last_step and self.checkpoints:
+      return None
+    self.last_step = step
+
+    self.checkpoint.save_counter.assign_add(1)
+    number = int(self.checkpoint.save_counter.numpy()) if step is None else step
+    name = 'ckpt-{}'.format(number)
+
+    self.wait()
+    staged, staging = self._stage(name)
+    path = os.path.join(self.directory, name)
+    self.pending = self.executor.submit(self._upload, staging, staged, path)
+    return path
+
+  def _stage(self, name):
+    # Writes the checkpoint to a new staging directory and returns its path
+    # and the directory. Unless staging_dir was given it's /dev/shm when that
+    # has room for a checkpoint the size of the last one, with some margin;
+    # the first one, whose size isn't known yet, falls back to the local
+    # temporary directory if /dev/shm runs out of space.
+    staging_dir = self.staging_dir
+    if staging_dir is None:
+      previous = checkpoint_size(self.latest_checkpoint) if self.checkpoints else 0
+      staging_dir = default_staging_dir(int(1.25 * previous))
+    while True:
+      staging = tempfile.mkdtemp(prefix='pix2pix_checkpoint_', dir=staging_dir)
+      try:
+        return self.checkpoint.write(os.path.join(staging, name)), staging
+      except (tf.errors.OpError, OSError):
+        shutil.rmtree(staging, ignore_errors=True)
+        if self.staging_dir is not None or staging_dir is None:
+          raise
+        staging_dir = None
+
+  def _upload(self, staging, staged, path):
+    try:
+      for source in checkpoint_files(staged):
+        tf.io.gfile.copy(source, path + source[len(staged):], overwrite=True)
+    finally:
+      shutil.rmtree(staging, ignore_errors=True)
+
+    # the marker is written to a temporary name and renamed, so it's either
+    # there or not
+    marker = path + COMPLETE_SUFFIX
+    with tf.io.gfile.GFile(marker + '.tmp', 'w') as f:
+      f.write(path + '\n')
+    tf.io.gfile.rename(marker + '.tmp', marker, overwrite=True)
+
+    if path in self.checkpoints:
+      self.checkpoints.remove(path)
+    self.checkpoints.append(path)
+    expired = self.checkpoints[:-self.max_to_keep] if self.max_to_keep else []
+    self.checkpoints = self.checkpoints[len(expired):]
+    tf.compat.v1.train.update_checkpoint_state(self.directory, path, self.checkpoints)
+
+    for old in expired:
+      for old_file in checkpoint_files(old) + [old + COMPLETE_SUFFIX]:
+        if tf.io.gfile.exists(old_file):
+          tf.io.gfile.remove(old_file)
+
+  def wait(self):
+    # Blocks until the checkpoint being uploaded, if any, is complete, and
+    # raises if the upload failed.
+    if self.pending is not None:
+      pending, self.pending = self.pending, None
+      pending.result()
+
+  @property
+  def latest_checkpoint(self):
+    return self.checkpoints[-1] if self.checkpoints else None
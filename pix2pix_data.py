@@ -0,0 +1,639 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Input pipeline for pix2pix.
+#
+# Each training example is a side by side JPEG: the real (target) image on the
+# left half and the input image on the right half.
+#
+# Decoding those JPEGs every epoch is the most expensive part of the pipeline,
+# so a dataset can be ingested once into a uint8 TFRecord cache:
+#
+#   python pix2pix_data.py ingest 'dataSet/dataSet/train/*.jpg' cache/train
+#   python pix2pix_data.py ingest 'dataSet/dataSet/test/*.jpg' cache/test
+#
+# and then read back with `cached_train_dataset` / `cached_test_dataset`.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import tensorflow as tf
+
+import argparse
+import glob
+import os
+import time
+
+
+BUFFER_SIZE = 500
+BATCH_SIZE = 1
+IMG_WIDTH = 512
+IMG_HEIGHT = 512
+
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+
+# ## Load the dataset
+
+def decode_pair(image_file):
+  image = tf.io.read_file(image_file)
+  image = tf.image.decode_jpeg(image)
+
+  w = tf.shape(image)[1]
+
+  w = w // 2
+  real_image = image[:, :w, :]
+  input_image = image[:, w:, :]
+
+  return input_image, real_image
+
+
+def load(image_file):
+  input_image, real_image = decode_pair(image_file)
+
+  input_image = tf.cast(input_image, tf.float32)
+  real_image = tf.cast(real_image, tf.float32)
+
+  return input_image, real_image
+
+
+def resize(input_image, real_image, height, width):
+  input_image = tf.image.resize(input_image, [height, width],
+                                method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
+  real_image = tf.image.resize(real_image, [height, width],
+                               method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
+
+  return input_image, real_image
+
+
+def random_crop(input_image, real_image):
+  stacked_image = tf.stack([input_image, real_image], axis=0)
+  cropped_image = tf.image.random_crop(
+      stacked_image, size=[2, IMG_HEIGHT, IMG_WIDTH, 3])
+
+  return cropped_image[0], cropped_image[1]
+
+
+# normalizing the images to [-1, 1]
+
+def normalize(input_image, real_image):
+  input_image = (input_image / 127.5) - 1
+  real_image = (real_image / 127.5) - 1
+
+  return input_image, real_image
+
+
+# The uint8 pipelines below leave the images as uint8 through shuffle and
+# batch, which makes every buffered element 4x smaller. The cast and scaling
+# to [-1, 1] is then done with normalize_uint8 at the start of `train_step`.
+
+def normalize_uint8(input_image, real_image):
+  input_image = tf.cast(input_image, tf.float32)
+  real_image = tf.cast(real_image, tf.float32)
+
+  return normalize(input_image, real_image)
+
+
+@tf.function()
+def random_jitter(input_image, real_image):
+  # resizing to 1.3x (666 x 666 x 3 at 512)
+  input_image, real_image = resize(input_image, real_image, int(IMG_WIDTH*1.3), int(IMG_HEIGHT*1.3))
+
+  # randomly cropping back to IMG_HEIGHT x IMG_WIDTH x 3
+  input_image, real_image = random_crop(input_image, real_image)
+
+  if tf.random.uniform(()) > 0.5:
+    # random mirroring
+    input_image = tf.image.flip_left_right(input_image)
+    real_image = tf.image.flip_left_right(real_image)
+
+  return input_image, real_image
+
+
+# Random jittering as described in the paper is to
+#
+# 1. Resize an image to bigger height and width
+# 2. Randomly crop to the target size
+# 3. Randomly flip the image horizontally
+
+def load_image_train(image_file):
+  input_image, real_image = load(image_file)
+  input_image, real_image = random_jitter(input_image, real_image)
+  input_image, real_image = normalize(input_image, real_image)
+
+  return input_image, real_image
+
+
+def load_image_test(image_file):
+  input_image, real_image = load(image_file)
+  input_image, real_image = resize(input_image, real_image,
+                                   IMG_HEIGHT, IMG_WIDTH)
+  input_image, real_image = normalize(input_image, real_image)
+
+  return input_image, real_image
+
+
+# ## Batched jitter
+#
+# `random_jitter` runs once per example, so every example pays for two small
+# resizes, a stack, a crop and a flip. `batch_random_jitter` does the same work
+# after `.batch()` on a whole [batch, H, W, 3] tensor: the resize, the
+# per-example crop offsets and the flips are applied together as two gathers
+# per image. This needs every source image in the dataset to have the same size.
+#
+# Passing per-example seeds makes the jitter reproducible. `seeded_random_jitter`
+# is the per-example version of the same seeded jitter, and gives bit-identical
+# results to `batch_random_jitter` for the same seeds.
+
+JITTER_HEIGHT = int(IMG_HEIGHT*1.3)
+JITTER_WIDTH = int(IMG_WIDTH*1.3)
+
+
+def jitter_params(seed):
+  # Crop offsets and flip decision for one example, from a [2] int seed.
+  crop_y_seed, crop_x_seed, flip_seed = tf.unstack(
+      tf.random.experimental.stateless_split(seed, num=3))
+
+  offset_y = tf.random.stateless_uniform([], crop_y_seed, maxval=JITTER_HEIGHT - IMG_HEIGHT + 1,
+                                         dtype=tf.int32)
+  offset_x = tf.random.stateless_uniform([], crop_x_seed, maxval=JITTER_WIDTH - IMG_WIDTH + 1,
+                                         dtype=tf.int32)
+  flip = tf.random.stateless_uniform([], flip_seed) > 0.5
+
+  return offset_y, offset_x, flip
+
+
+@tf.function()
+def seeded_random_jitter(input_image, real_image, seed):
+  input_image, real_image = resize(input_image, real_image, JITTER_HEIGHT, JITTER_WIDTH)
+
+  offset_y, offset_x, flip = jitter_params(seed)
+  input_image = input_image[offset_y:offset_y + IMG_HEIGHT, offset_x:offset_x + IMG_WIDTH]
+  real_image = real_image[offset_y:offset_y + IMG_HEIGHT, offset_x:offset_x + IMG_WIDTH]
+
+  if flip:
+    input_image = tf.image.flip_left_right(input_image)
+    real_image = tf.image.flip_left_right(real_image)
+
+  return input_image, real_image
+
+
+def nearest_source_index(positions, in_size, out_size):
+  # Index into a length `in_size` axis that tf.image.resize(...,
+  # NEAREST_NEIGHBOR) reads for `positions` of a length `out_size` output.
+  scale = tf.cast(in_size, tf.float32) / tf.cast(out_size, tf.float32)
+  index = tf.floor((tf.cast(positions, tf.float32) + 0.5) * scale)
+  return tf.minimum(tf.cast(index, tf.int32), in_size - 1)
+
+
+def crop_and_flip(images, offset_y, offset_x, flip):
+  # Equivalent to resizing a [batch, H, W, C] tensor to JITTER_HEIGHT x
+  # JITTER_WIDTH, cropping IMG_HEIGHT x IMG_WIDTH at the per-example offsets
+  # and mirroring the examples where `flip` is set. The crop window is picked
+  # in resized coordinates and only those pixels are gathered from the source,
+  # so the 1.3x image is never materialised and the dtype (e.g. uint8) is kept.
+  shape = tf.shape(images)
+
+  rows = offset_y[:, tf.newaxis] + tf.range(IMG_HEIGHT)
+  cols = offset_x[:, tf.newaxis] + tf.range(IMG_WIDTH)
+  cols = tf.where(flip[:, tf.newaxis], tf.reverse(cols, axis=[1]), cols)
+
+  rows = nearest_source_index(rows, shape[1], JITTER_HEIGHT)
+  cols = nearest_source_index(cols, shape[2], JITTER_WIDTH)
+
+  images = tf.gather(images, rows, axis=1, batch_dims=1)
+  return tf.gather(images, cols, axis=2, batch_dims=1)
+
+
+def random_jitter_params(batch_size, seeds=None):
+  if seeds is not None:
+    return tf.map_fn(jitter_params, seeds,
+                     fn_output_signature=(tf.int32, tf.int32, tf.bool))
+
+  offset_y = tf.random.uniform([batch_size], maxval=JITTER_HEIGHT - IMG_HEIGHT + 1,
+                               dtype=tf.int32)
+  offset_x = tf.random.uniform([batch_size], maxval=JITTER_WIDTH - IMG_WIDTH + 1,
+                               dtype=tf.int32)
+  flip = tf.random.uniform([batch_size]) > 0.5
+
+  return offset_y, offset_x, flip
+
+
+@tf.function()
+def batch_random_jitter(input_images, real_images, seeds=None):
+  # Both images of a pair share the same crop offsets and flip.
+  offset_y, offset_x, flip = random_jitter_params(tf.shape(input_images)[0], seeds)
+
+  input_images = crop_and_flip(input_images, offset_y, offset_x, flip)
+  real_images = crop_and_flip(real_images, offset_y, offset_x, flip)
+
+  return input_images, real_images
+
+
+# ## Crop-before-resize jitter
+#
+# `fused_random_jitter` is the per-example form of `batch_random_jitter`: it
+# has the same output distribution as `random_jitter`, but samples the crop
+# straight out of the source image instead of resizing it to 1.3x first. It
+# works on the uint8 halves from `decode_pair`, so the cast to float32 only
+# happens on the IMG_HEIGHT x IMG_WIDTH crop.
+
+@tf.function()
+def fused_random_jitter(input_image, real_image, seed=None):
+  seeds = None if seed is None else seed[tf.newaxis]
+  input_image, real_image = batch_random_jitter(input_image[tf.newaxis],
+                                                real_image[tf.newaxis], seeds)
+
+  return input_image[0], real_image[0]
+
+
+def set_image_size(height, width):
+  # Changes IMG_HEIGHT x IMG_WIDTH for everything in this module. The jitter
+  # functions are wrapped again so no graph traced at the old size is reused.
+  global IMG_HEIGHT, IMG_WIDTH, JITTER_HEIGHT, JITTER_WIDTH
+  global random_jitter, seeded_random_jitter, batch_random_jitter, fused_random_jitter
+
+  IMG_HEIGHT, IMG_WIDTH = height, width
+  JITTER_HEIGHT, JITTER_WIDTH = int(IMG_HEIGHT*1.3), int(IMG_WIDTH*1.3)
+
+  random_jitter = tf.function(random_jitter.python_function)
+  seeded_random_jitter = tf.function(seeded_random_jitter.python_function)
+  batch_random_jitter = tf.function(batch_random_jitter.python_function)
+  fused_random_jitter = tf.function(fused_random_jitter.python_function)
+
+
+def load_image_train_uint8(image_file):
+  input_image, real_image = decode_pair(image_file)
+  input_image, real_image = fused_random_jitter(input_image, real_image)
+
+  return input_image, real_image
+
+
+# ## Pre-decoded pair cache
+#
+# The cache is a set of TFRecord shards. Every record holds one pair, already
+# split into its input and real halves and stored as raw uint8 pixels, so
+# reading it back is a memcpy instead of a JPEG decode.
+
+def _bytes_feature(value):
+  return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+
+def _int64_feature(value):
+  return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
+
+
+def serialize_pair(input_image, real_image):
+  # The halves of a pair with an odd width differ by a column, so the real
+  # image's width is stored as well.
+  height, width, channels = input_image.shape
+  feature = {
+    'height': _int64_feature(height),
+    'width': _int64_feature(width),
+    'real_width': _int64_feature(real_image.shape[1]),
+    'channels': _int64_feature(channels),
+    'input_image': _bytes_feature(input_image.tobytes()),
+    'real_image': _bytes_feature(real_image.tobytes()),
+  }
+  example = tf.train.Example(features=tf.train.Features(feature=feature))
+  return example.SerializeToString()
+
+
+def shard_names(output_prefix, num_shards):
+  return ['{}-{:05d}-of-{:05d}.tfrecord'.format(output_prefix, i, num_shards)
+          for i in range(num_shards)]
+
+
+def ingest(file_pattern, output_prefix, num_shards=8):
+  # Decodes and splits every pair matching `file_pattern` once and writes the
+  # uint8 halves round robin into `num_shards` TFRecord files.
+  files = sorted(glob.glob(file_pattern))
+  if not files:
+    raise ValueError('No files match {}'.format(file_pattern))
+
+  output_dir = os.path.dirname(output_prefix)
+  if output_dir:
+    os.makedirs(output_dir, exist_ok=True)
+
+  dataset = tf.data.Dataset.from_tensor_slices(files)
+  dataset = dataset.map(decode_pair, num_parallel_calls=AUTOTUNE)
+  dataset = dataset.prefetch(AUTOTUNE)
+
+  names = shard_names(output_prefix, num_shards)
+  writers = [tf.io.TFRecordWriter(name) for name in names]
+  try:
+    for n, (input_image, real_image) in enumerate(dataset):
+      record = serialize_pair(input_image.numpy(), real_image.numpy())
+      writers[n % num_shards].write(record)
+  finally:
+    for writer in writers:
+      writer.close()
+
+  return names
+
+
+_FEATURE_DESCRIPTION = {
+  'height': tf.io.FixedLenFeature([], tf.int64),
+  'width': tf.io.FixedLenFeature([], tf.int64),
+  # -1 in caches written before it was stored, where both halves are `width`
+  'real_width': tf.io.FixedLenFeature([], tf.int64, default_value=-1),
+  'channels': tf.io.FixedLenFeature([], tf.int64),
+  'input_image': tf.io.FixedLenFeature([], tf.string),
+  'real_image': tf.io.FixedLenFeature([], tf.string),
+}
+
+
+def parse_pair(record):
+  example = tf.io.parse_single_example(record, _FEATURE_DESCRIPTION)
+  shape = tf.stack([example['height'], example['width'], example['channels']])
+  real_width = tf.where(example['real_width'] < 0, example['width'], example['real_width'])
+  real_shape = tf.stack([example['height'], real_width, example['channels']])
+
+  input_image = tf.reshape(tf.io.decode_raw(example['input_image'], tf.uint8), shape)
+  real_image = tf.reshape(tf.io.decode_raw(example['real_image'], tf.uint8), real_shape)
+
+  return input_image, real_image
+
+
+def load_cache(cache_pattern, shuffle=True, seed=None, cycle_length=None,
+               num_parallel_calls=AUTOTUNE, deterministic=None):
+  # Dataset of (input_image, real_image) uint8 pairs read from the shards,
+  # `cycle_length` shards at a time (default: one per CPU core).
+  files = tf.data.Dataset.list_files(cache_pattern, shuffle=shuffle, seed=seed)
+  dataset = files.interleave(tf.data.TFRecordDataset,
+                             cycle_length=cycle_length,
+                             num_parallel_calls=num_parallel_calls,
+                             deterministic=deterministic)
+  return dataset.map(parse_pair, num_parallel_calls=num_parallel_calls,
+                     deterministic=deterministic)
+
+
+# ## Input pipeline builders
+#
+# The training pipeline shuffles file names, not decoded images: list_files
+# reshuffles the whole file list every epoch, which is a full-dataset shuffle
+# that costs a few bytes per file, and the decoded images are then mapped,
+# batched and prefetched in that order. The TFRecord cache can only shuffle
+# whole shards, so records are also shuffled (as uint8 pairs, before the
+# jitter) through a `buffer_size` buffer.
+#
+# jitter is one of
+#  'per_example' - random_jitter, resize to 1.3x then crop, one example at a time
+#  'fused'       - fused_random_jitter, crops straight out of the uint8 source
+#  'batched'     - batch_random_jitter after `.batch()`, needs every training
+#                  image to be the same size
+#
+# With `seed` set every stage is seeded and the order is deterministic, and
+# the three jitters give bit-identical batches. With `keep_uint8` the batches
+# are left as uint8 for normalize_uint8 in `train_step`.
+
+JITTER_MODES = ('per_example', 'fused', 'batched')
+
+
+def example_seeds(dataset, seed):
+  # Attaches a [seed, index] stateless seed to every element of `dataset`.
+  return dataset.enumerate().map(
+      lambda n, pair: (pair[0], pair[1], tf.stack([tf.constant(seed, tf.int64), n])))
+
+
+def jitter_and_batch_stages(batch_size=BATCH_SIZE, jitter='per_example', keep_uint8=False,
+                            seed=None, num_parallel_calls=AUTOTUNE, deterministic=None):
+  # Stages that jitter and batch a dataset of uint8 (input_image, real_image)
+  # pairs, as a list of (name, function from dataset to dataset).
+  if jitter not in JITTER_MODES:
+    raise ValueError('jitter must be one of {}, got {!r}'.format(JITTER_MODES, jitter))
+
+  def map_stage(map_func):
+    return lambda dataset: dataset.map(map_func, num_parallel_calls=num_parallel_calls,
+                                       deterministic=deterministic)
+
+  if jitter == 'fused':
+    map_func = fused_random_jitter
+  elif jitter == 'batched':
+    map_func = batch_random_jitter
+  elif seed is None:
+    map_func = random_jitter
+  else:
+    map_func = seeded_random_jitter
+
+  stages = []
+  if seed is not None:
+    stages.append(('seed', lambda dataset: example_seeds(dataset, seed)))
+
+  batch_stage = ('batch', lambda dataset: dataset.batch(batch_size))
+  if jitter == 'batched':
+    stages += [batch_stage, ('random_jitter', map_stage(map_func))]
+  else:
+    stages += [('random_jitter', map_stage(map_func)), batch_stage]
+
+  if not keep_uint8:
+    stages.append(('normalize', map_stage(normalize_uint8)))
+
+  return stages
+
+
+def apply_stages(stages, dataset=None):
+  for name, stage in stages:
+    dataset = stage(dataset)
+  return dataset
+
+
+def jitter_and_batch(dataset, batch_size=BATCH_SIZE, jitter='per_example', keep_uint8=False,
+                     seed=None, num_parallel_calls=AUTOTUNE, deterministic=None):
+  return apply_stages(jitter_and_batch_stages(batch_size, jitter, keep_uint8, seed,
+                                              num_parallel_calls, deterministic), dataset)
+
+
+def train_stages(file_pattern, batch_size=BATCH_SIZE, jitter='per_example', keep_uint8=False,
+                 seed=None, num_parallel_calls=AUTOTUNE, deterministic=None):
+  # The stages of make_train_dataset, starting from nothing; the first stage
+  # lists (and shuffles) the files.
+  if deterministic is None and seed is not None:
+    deterministic = True
+
+  stages = [
+    ('shuffle', lambda _: tf.data.Dataset.list_files(file_pattern, shuffle=True, seed=seed)),
+    ('load', lambda dataset: dataset.map(decode_pair, num_parallel_calls=num_parallel_calls,
+                                         deterministic=deterministic)),
+  ]
+  stages += jitter_and_batch_stages(batch_size, jitter, keep_uint8, seed,
+                                    num_parallel_calls, deterministic)
+  stages.append(('prefetch', lambda dataset: dataset.prefetch(AUTOTUNE)))
+
+  return stages
+
+
+def make_train_dataset(file_pattern, batch_size=BATCH_SIZE, jitter='per_example',
+                       keep_uint8=False, seed=None, num_parallel_calls=AUTOTUNE,
+                       deterministic=None):
+  return apply_stages(train_stages(file_pattern, batch_size, jitter, keep_uint8, seed,
+                                   num_parallel_calls, deterministic))
+
+
+def test_stages(file_pattern, batch_size=BATCH_SIZE, shuffle=True, keep_uint8=False,
+                num_parallel_calls=AUTOTUNE):
+  # shuffle=False keeps the files in order, e.g. for a running animation
+  deterministic = None if num_parallel_calls is None else not shuffle
+
+  def map_stage(map_func):
+    return lambda dataset: dataset.map(map_func, num_parallel_calls=num_parallel_calls,
+                                       deterministic=deterministic)
+
+  stages = [
+    ('shuffle', lambda _: tf.data.Dataset.list_files(file_pattern, shuffle=shuffle)),
+    ('load', map_stage(decode_pair)),
+    ('resize', map_stage(lambda input_image, real_image: resize(
+        input_image, real_image, IMG_HEIGHT, IMG_WIDTH))),
+    ('batch', lambda dataset: dataset.batch(batch_size)),
+  ]
+  if not keep_uint8:
+    stages.append(('normalize', map_stage(normalize_uint8)))
+  stages.append(('prefetch', lambda dataset: dataset.prefetch(AUTOTUNE)))
+
+  return stages
+
+
+def make_test_dataset(file_pattern, batch_size=BATCH_SIZE, shuffle=True, keep_uint8=False,
+                      num_parallel_calls=AUTOTUNE):
+  return apply_stages(test_stages(file_pattern, batch_size, shuffle, keep_uint8,
+                                  num_parallel_calls))
+
+
+def cached_train_dataset(cache_pattern, buffer_size=BUFFER_SIZE, batch_size=BATCH_SIZE,
+                         jitter='per_example', keep_uint8=False, seed=None,
+                         cycle_length=None, num_parallel_calls=AUTOTUNE, deterministic=None):
+  if deterministic is None and seed is not None:
+    deterministic = True
+
+  train_dataset = load_cache(cache_pattern, shuffle=True, seed=seed, cycle_length=cycle_length,
+                             num_parallel_calls=num_parallel_calls, deterministic=deterministic)
+  train_dataset = train_dataset.shuffle(buffer_size, seed=seed)
+  train_dataset = jitter_and_batch(train_dataset, batch_size, jitter, keep_uint8, seed,
+                                   num_parallel_calls, deterministic)
+
+  return train_dataset.prefetch(AUTOTUNE)
+
+
+def cached_test_dataset(cache_pattern, batch_size=BATCH_SIZE, shuffle=True, keep_uint8=False,
+                        num_parallel_calls=AUTOTUNE):
+  test_dataset = load_cache(cache_pattern, shuffle=shuffle,
+                            num_parallel_calls=num_parallel_calls, deterministic=not shuffle)
+  test_dataset = test_dataset.map(lambda input_image, real_image: resize(
+      input_image, real_image, IMG_HEIGHT, IMG_WIDTH))
+  test_dataset = test_dataset.batch(batch_size)
+  if not keep_uint8:
+    test_dataset = test_dataset.map(normalize_uint8)
+
+  return test_dataset.prefetch(AUTOTUNE)
+
+
+def eval_stages(file_pattern, batch_size=BATCH_SIZE, cache_filename='', from_cache=False,
+                num_parallel_calls=AUTOTUNE):
+  # The test set in a fixed order for evaluation, decoded and resized once:
+  # the first pass keeps the uint8 pairs in memory, or in `cache_filename`,
+  # and later passes only batch and normalize them. With `from_cache`,
+  # file_pattern matches the TFRecord shards written by `ingest`.
+  deterministic = None if num_parallel_calls is None else True
+
+  def map_stage(map_func):
+    return lambda dataset: dataset.map(map_func, num_parallel_calls=num_parallel_calls,
+                                       deterministic=deterministic)
+
+  if from_cache:
+    stages = [('load', lambda _: load_cache(file_pattern, shuffle=False,
+                                            num_parallel_calls=num_parallel_calls,
+                                            deterministic=deterministic))]
+  else:
+    stages = [
+      ('list', lambda _: tf.data.Dataset.list_files(file_pattern, shuffle=False)),
+      ('load', map_stage(decode_pair)),
+    ]
+  stages += [
+    ('resize', map_stage(lambda input_image, real_image: resize(
+        input_image, real_image, IMG_HEIGHT, IMG_WIDTH))),
+    ('cache', lambda dataset: dataset.cache(cache_filename)),
+    ('batch', lambda dataset: dataset.batch(batch_size)),
+    ('normalize', lambda dataset: dataset.map(normalize_uint8)),
+    ('prefetch', lambda dataset: dataset.prefetch(AUTOTUNE)),
+  ]
+
+  return stages
+
+
+def make_eval_dataset(file_pattern, batch_size=BATCH_SIZE, cache_filename='', from_cache=False,
+                      num_parallel_calls=AUTOTUNE):
+  return apply_stages(eval_stages(file_pattern, batch_size, cache_filename, from_cache,
+                                  num_parallel_calls))
+
+
+# ## Memory use
+#
+# The shuffle buffer holds `buffer_size` decoded pairs, which is where most of
+# the pipeline's host memory goes.
+
+def element_bytes(dataset):
+  # Size in bytes of one element of `dataset`.
+  element = next(iter(dataset))
+  return sum(t.numpy().nbytes for t in tf.nest.flatten(element))
+
+
+def resident_bytes():
+  # Current resident set size of this process, or None off Linux.
+  try:
+    with open('/proc/self/statm') as f:
+      pages = int(f.read().split()[1])
+  except (IOError, OSError, IndexError, ValueError):
+    return None
+  return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure_shuffle_memory(dataset, buffer_size=BUFFER_SIZE):
+  # Fills a shuffle buffer of `buffer_size` elements of `dataset` and returns
+  # (estimated bytes, measured resident bytes) held by it.
+  estimate = buffer_size * element_bytes(dataset)
+
+  before = resident_bytes()
+  iterator = iter(dataset.repeat().shuffle(buffer_size))
+  next(iterator)
+  after = resident_bytes()
+  del iterator
+
+  measured = None if before is None else after - before
+  return estimate, measured
+
+
+def main():
+  parser = argparse.ArgumentParser(description='pix2pix input pipeline tools')
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  ingest_parser = subparsers.add_parser(
+      'ingest', help='decode and split side by side JPEGs into a uint8 cache')
+  ingest_parser.add_argument('file_pattern', help="e.g. 'dataSet/train/*.jpg'")
+  ingest_parser.add_argument('output_prefix', help='e.g. cache/train')
+  ingest_parser.add_argument('--shards', type=int, default=8)
+
+  memory_parser = subparsers.add_parser(
+      'memory', help='compare shuffle buffer memory of the float32 and uint8 pipelines')
+  memory_parser.add_argument('file_pattern', help="e.g. 'dataSet/train/*.jpg'")
+  memory_parser.add_argument('--buffer-size', type=int, default=BUFFER_SIZE)
+
+  args = parser.parse_args()
+
+  if args.command == 'ingest':
+    start = time.time()
+    names = ingest(args.file_pattern, args.output_prefix, args.shards)
+    print('Wrote {} shards in {:.1f} sec'.format(len(names), time.time() - start))
+
+  elif args.command == 'memory':
+    files = tf.data.Dataset.list_files(args.file_pattern)
+    # uint8 first, so its measurement isn't made on top of the float32 buffer
+    for name, map_func in [('uint8', load_image_train_uint8),
+                           ('float32', load_image_train)]:
+      dataset = files.map(map_func, num_parallel_calls=AUTOTUNE)
+      estimate, measured = measure_shuffle_memory(dataset, args.buffer_size)
+      print('{:8s} shuffle buffer of {}: {:.1f} MB estimated, {} MB measured'.format(
+          name, args.buffer_size, estimate / 1e6,
+          'n/a' if measured is None else '{:.1f}'.format(measured / 1e6)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Export a trained pix2pix generator for serving.
+#
+# Restores the generator from the latest training checkpoint and writes a
+# SavedModel whose serving signature takes uint8 [batch, H, W, 3] images and
+# returns uint8 images, with the [-1, 1] scaling done in the graph, so a
+# client never has to know how the model was trained. Optionally the
+# SavedModel is also converted to TFLite, as float, with dynamic range
+# (int8 weights) or with int8 quantization calibrated on training images:
+#
+#   python pix2pix_export.py /content/drive/MyDrive/checkPoints export/ \
+#       --tflite float,dynamic,int8 --calibrate 'dataSet/train/*.jpg' --benchmark
+#
+# --benchmark times every variant on the CPU, single image latency and
+# batched throughput, and prints a table comparing them.
+#
+# int8 calibration draws its images from the train_dataset pipeline
+# (pix2pix_data.make_train_dataset, jitter included), so the activation ranges
+# are those the generator saw in training. --quality runs the quantized
+# variants and the float SavedModel over the test split and reports how far
+# the quantized outputs are from the float ones (L1 and PSNR), the change in
+# L1/PSNR against the targets, and the CPU speedup:
+#
+#   python pix2pix_export.py /content/drive/MyDrive/checkPoints export/ \
+#       --tflite int8 --calibrate 'dataSet/train/*.jpg' --quality 'dataSet/test/*.jpg'
+#
+# BatchNorm is folded into the convolutions and Dropout removed (see
+# pix2pix_infer.fold_batchnorm) unless --batch-statistics is given, which
+# keeps the training=True behaviour of generate_images.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import tensorflow as tf
+
+import argparse
+import json
+import os
+import time
+
+from pix2pix_data import (IMG_WIDTH, IMG_HEIGHT, make_train_dataset, cached_train_dataset,
+                          make_eval_dataset)
+from pix2pix_infer import load_generator, fold_batchnorm, to_uint8
+
+
+TFLITE_VARIANTS = ('float', 'dynamic', 'int8')
+
+
+def seed_states(layer):
+  # State variables of the Keras random seed generators (Dropout's) in
+  # `layer` and the layers inside it.
+  states = []
+  seed_generator = getattr(layer, 'seed_generator', None)
+  if seed_generator is not None:
+    states.append(seed_generator.state)
+  for sublayer in getattr(layer, 'layers', ()):
+    states += seed_states(sublayer)
+  return states
+
+
+class ServingModule(tf.Module):
+  # The generator behind a uint8 in, uint8 out signature.
+
+  def __init__(self, generator, training=False):
+    super(ServingModule, self).__init__()
+    self.generator = generator
+    self.training = training
+    # With training=True, Dropout draws from its seed generator, whose state
+    # the SavedModel only saves if the module tracks it
+    self.seed_states = seed_states(generator) if training else []
+    self.serve = tf.function(self._serve, input_signature=[
+        tf.TensorSpec([None, IMG_HEIGHT, IMG_WIDTH, 3], tf.uint8, name='images')])
+
+  def _serve(self, images):
+    inputs = (tf.cast(images, tf.float32) / 127.5) - 1
+    return {'translated': to_uint8(self.generator(inputs, training=self.training))}
+
+
+def calibration_images(dataset, count=64):
+  # The first `count` input images of `dataset`, a batched (input_image,
+  # target) dataset such as train_dataset, as a uint8 [count, H, W, 3] numpy
+  # array. The inputs may be [-1, 1] floats or uint8 (UINT8_PIPELINE).
+  images = []
+  for input_image, _ in dataset.unbatch().take(count):
+    if input_image.dtype != tf.uint8:
+      input_image = to_uint8(input_image)
+    images.append(input_image.numpy())
+  if not images:
+    raise ValueError('No calibration images in the dataset')
+  return np.stack(images)
+
+
+def save_serving_model(generator, saved_model_dir, training=False):
+  module = ServingModule(generator, training)
+  tf.saved_model.save(module, saved_model_dir,
+                      signatures={'serving_default': module.serve})
+  return saved_model_dir
+
+
+def convert_tflite(saved_model_dir, path, quantization='float', calibration=None):
+  # `quantization` is one of TFLITE_VARIANTS. int8 needs `calibration`, uint8
+  # images whose activation ranges set the quantization; ops without an int8
+  # kernel stay in float.
+  #
+  # Converted from the loaded signature rather than from_saved_model, which leaves
+  # variable reads in the model that int8 calibration can't run
+  loaded = tf.saved_model.load(saved_model_dir)
+  converter = tf.lite.TFLiteConverter.from_concrete_functions(
+      [loaded.signatures['serving_default']], loaded)
+  if quantization in ('dynamic', 'int8'):
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+  if quantization == 'int8':
+    if calibration is None:
+      raise ValueError('int8 quantization needs calibration images')
+    converter.representative_dataset = lambda: ([image[None]] for image in calibration)
+  elif quantization not in TFLITE_VARIANTS:
+    raise ValueError('Unknown quantization {}'.format(quantization))
+
+  with tf.io.gfile.GFile(path, 'wb') as f:
+    f.write(converter.convert())
+  return path
+
+
+def export_generator(generator, export_dir, tflite=(), calibration=None, frozen_bn=True):
+  # Writes export_dir/saved_model and export_dir/generator_<variant>.tflite
+  # for each of `tflite`, and returns {variant: path}.
+  if frozen_bn:
+    generator = fold_batchnorm(generator)
+  paths = {'saved_model': save_serving_model(generator, os.path.join(export_dir, 'saved_model'),
+                                             training=not frozen_bn)}
+  for quantization in tflite:
+    paths['tflite_' + quantization] = convert_tflite(
+        paths['saved_model'],
+        os.path.join(export_dir, 'generator_{}.tflite'.format(quantization)),
+        quantization, calibration)
+  return paths
+
+
+# ## Benchmark
+
+class SavedModelRunner(object):
+
+  def __init__(self, path):
+    self.signature = tf.saved_model.load(path).signatures['serving_default']
+
+  def __call__(self, images):
+    return self.signature(images=tf.constant(images))['translated'].numpy()
+
+
+class TFLiteRunner(object):
+  # The interpreter is resized whenever the batch size changes.
+
+  def __init__(self, path, num_threads=None):
+    self.interpreter = tf.lite.Interpreter(model_path=path, num_threads=num_threads)
+    self.input = self.interpreter.get_input_details()[0]['index']
+    self.output = self.interpreter.get_output_details()[0]['index']
+    self.batch_size = None
+
+  def __call__(self, images):
+    if images.shape[0] != self.batch_size:
+      self.interpreter.resize_tensor_input(self.input, images.shape)
+      self.interpreter.allocate_tensors()
+      self.batch_size = images.shape[0]
+    self.interpreter.set_tensor(self.input, images)
+    self.interpreter.invoke()
+    return self.interpreter.get_tensor(self.output)
+
+
+def make_runner(variant, path, num_threads=None):
+  if variant == 'saved_model':
+    return SavedModelRunner(path)
+  return TFLiteRunner(path, num_threads)
+
+
+def time_calls(runner, images, runs, warmup=2):
+  # Seconds per call, after `warmup` calls (tracing, tensor allocation).
+  for _ in range(warmup):
+    runner(images)
+  timings = []
+  for _ in range(runs):
+    start = time.perf_counter()
+    runner(images)
+    timings.append(time.perf_counter() - start)
+  return timings
+
+
+def benchmark(paths, images, runs=10, batch_size=8, num_threads=None):
+  # Single image latency and batch throughput of every exported variant on
+  # `images`, uint8 [N, H, W, 3] (repeated up to batch_size if needed).
+  batch = np.resize(images, (batch_size,) + images.shape[1:])
+  results = []
+  for variant, path in paths.items():
+    runner = make_runner(variant, path, num_threads)
+    latency = np.array(time_calls(runner, batch[:1], runs)) * 1000.
+    throughput = time_calls(runner, batch, runs)
+    results.append({
+      'variant': variant,
+      'size_mb': directory_size(path) / 1e6,
+      'latency_ms_p50': float(np.percentile(latency, 50)),
+      'latency_ms_p90': float(np.percentile(latency, 90)),
+      'images_per_sec': batch_size / float(np.median(throughput)),
+    })
+  return results
+
+
+# PSNR of identical images is infinite, which JSON can't hold.
+MAX_PSNR = 100.
+
+
+def psnr_from_mse(mse, max_val=2.0):
+  return min(10. * np.log10(max_val**2 / mse), MAX_PSNR) if mse > 0 else MAX_PSNR
+
+
+def error_sums(target, prediction):
+  # Summed per image L1 and mean squared error of [-1, 1] images.
+  difference = tf.cast(target, tf.float32) - tf.cast(prediction, tf.float32)
+  return np.array([float(tf.reduce_sum(tf.reduce_mean(tf.abs(difference), axis=[1, 2, 3]))),
+                   float(tf.reduce_sum(tf.reduce_mean(tf.square(difference), axis=[1, 2, 3])))])
+
+
+def quantization_report(paths, test_dataset, runs=10, num_threads=None, reference='saved_model'):
+  # For every variant in `paths` other than `reference` (the float model):
+  # L1 and PSNR of its outputs against the reference's over `test_dataset`,
+  # a batched (input_image, target) dataset in [-1, 1], both models' L1 and
+  # PSNR against the targets, and the single image CPU latency of each. PSNR
+  # is that of the mean squared error over all the images, up to MAX_PSNR.
+  def to_float(images):
+    return (tf.cast(images, tf.float32) / 127.5) - 1
+
+  runners = {variant: make_runner(variant, path, num_threads) for variant, path in paths.items()}
+  sums = {variant: np.zeros(4) for variant in runners if variant != reference}
+  reference_sums = np.zeros(2)
+  count = 0
+  first = None
+  for input_image, target in test_dataset:
+    images = to_uint8(input_image).numpy()
+    if first is None:
+      first = images[:1]
+    expected = to_float(runners[reference](images))
+    reference_sums += error_sums(target, expected)
+    for variant in sums:
+      output = to_float(runners[variant](images))
+      sums[variant] += np.concatenate([error_sums(expected, output), error_sums(target, output)])
+    count += len(images)
+  if first is None:
+    raise ValueError('The test dataset is empty')
+
+  reference_l1, reference_mse = reference_sums / count
+  reference_psnr = psnr_from_mse(reference_mse)
+  reference_ms = 1000. * float(np.median(time_calls(runners[reference], first, runs)))
+  results = []
+  for variant, variant_sums in sums.items():
+    l1_vs_float, mse_vs_float, l1, mse = variant_sums / count
+    psnr_vs_float, psnr = psnr_from_mse(mse_vs_float), psnr_from_mse(mse)
+    ms = 1000. * float(np.median(time_calls(runners[variant], first, runs)))
+    results.append({
+      'variant': variant,
+      'l1_vs_float': float(l1_vs_float),
+      'psnr_vs_float': float(psnr_vs_float),
+      'l1_delta': float(l1 - reference_l1),
+      'psnr_delta': float(psnr - reference_psnr),
+      'latency_ms': ms,
+      'speedup': reference_ms / ms,
+    })
+  return {'reference': reference, 'images': count, 'l1': float(reference_l1),
+          'psnr': float(reference_psnr), 'latency_ms': reference_ms, 'variants': results}
+
+
+def print_quantization_report(report):
+  print('{reference} over {images} test images: L1 {l1:.4f}, PSNR {psnr:.2f} dB, '
+        '{latency_ms:.1f} ms/image'.format(**report))
+  print('{:>15s} {:>12s} {:>14s} {:>9s} {:>11s} {:>9s}'.format(
+      'variant', 'L1 vs float', 'PSNR vs float', 'L1 delta', 'PSNR delta', 'speedup'))
+  for result in report['variants']:
+    print('{variant:>15s} {l1_vs_float:>12.4f} {psnr_vs_float:>14.2f} {l1_delta:>+9.4f} '
+          '{psnr_delta:>+11.2f} {speedup:>8.2f}x'.format(**result))
+
+
+def directory_size(path):
+  if not os.path.isdir(path):
+    return os.path.getsize(path)
+  return sum(os.path.getsize(os.path.join(root, name))
+             for root, _, names in os.walk(path) for name in names)
+
+
+def print_benchmark(results, batch_size):
+  print('{:>15s} {:>9s} {:>9s} {:>9s} {:>20s}'.format(
+      'variant', 'size MB', 'p50 ms', 'p90 ms', 'images/sec (batch {})'.format(batch_size)))
+  for result in results:
+    print('{variant:>15s} {size_mb:>9.1f} {latency_ms_p50:>9.1f} {latency_ms_p90:>9.1f} '
+          '{images_per_sec:>20.2f}'.format(**result))
+
+
+def str_list(value):
+  return [v for v in value.split(',') if v]
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Export a trained pix2pix generator for serving')
+  parser.add_argument('checkpoint_dir', help='training checkpoint directory')
+  parser.add_argument('export_dir')
+  parser.add_argument('--tflite', type=str_list, default=[],
+                      help='comma separated TFLite variants to write: ' + ', '.join(TFLITE_VARIANTS))
+  parser.add_argument('--calibrate', metavar='PATTERN',
+                      help="training pairs for int8 calibration and the benchmark, drawn "
+                           "through the train_dataset pipeline, e.g. 'dataSet/train/*.jpg'")
+  parser.add_argument('--calibration-images', type=int, default=64)
+  parser.add_argument('--quality', metavar='PATTERN',
+                      help="test pairs to compare the TFLite variants with the float model on, "
+                           "e.g. 'dataSet/test/*.jpg'")
+  parser.add_argument('--from-cache', action='store_true',
+                      help='--calibrate and --quality match TFRecord shards written by '
+                           'pix2pix_data.py ingest')
+  parser.add_argument('--batch-statistics', action='store_true',
+                      help='keep training=True BatchNorm instead of folding it')
+  parser.add_argument('--benchmark', action='store_true',
+                      help='time every variant on the CPU')
+  parser.add_argument('--runs', type=int, default=10)
+  parser.add_argument('--batch-size', type=int, default=8, help='benchmark batch size')
+  parser.add_argument('--threads', type=int, default=None, help='TFLite interpreter threads')
+  parser.add_argument('--output', help='write the benchmark and quality results to this JSON file')
+  args = parser.parse_args()
+
+  for variant in args.tflite:
+    if variant not in TFLITE_VARIANTS:
+      parser.error('unknown TFLite variant {}'.format(variant))
+
+  calibration = None
+  if args.calibrate:
+    if args.from_cache:
+      train_dataset = cached_train_dataset(args.calibrate, seed=0)
+    else:
+      train_dataset = make_train_dataset(args.calibrate, seed=0)
+    calibration = calibration_images(train_dataset, args.calibration_images)
+
+  generator = load_generator(args.checkpoint_dir)
+  paths = export_generator(generator, args.export_dir, args.tflite, calibration,
+                           frozen_bn=not args.batch_statistics)
+  for variant, path in paths.items():
+    print('Wrote', variant, path)
+
+  results = {}
+  if args.benchmark:
+    if calibration is None:
+      calibration = np.random.randint(0, 256, [1, IMG_HEIGHT, IMG_WIDTH, 3], dtype=np.uint8)
+    results['benchmark'] = benchmark(paths, calibration, args.runs, args.batch_size,
+                                     args.threads)
+    print_benchmark(results['benchmark'], args.batch_size)
+
+  if args.quality and args.tflite:
+    test_dataset = make_eval_dataset(args.quality, args.batch_size, from_cache=args.from_cache)
+    results['quality'] = quantization_report(paths, test_dataset, args.runs, args.threads)
+    print_quantization_report(results['quality'])
+
+  if args.output and results:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
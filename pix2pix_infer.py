@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Batch inference with a trained pix2pix generator.
+#
+# Streams a folder of input images through the generator in large batches and
+# writes the raw outputs as PNGs (no matplotlib figures):
+#
+#   python pix2pix_infer.py /content/drive/MyDrive/checkPoints frames/ out/
+#
+# Decoding is done by a prefetching tf.data pipeline and PNG encoding and
+# writing by a thread pool, so both overlap with the generator. Outputs are
+# written to a temporary name and renamed when complete, and inputs that
+# already have an output are skipped, so an interrupted job can simply be
+# run again to resume.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import tensorflow as tf
+
+import argparse
+import concurrent.futures
+import glob
+import os
+import time
+
+from pix2pix_data import IMG_WIDTH, IMG_HEIGHT, AUTOTUNE
+from pix2pix_model import Generator, load_model_config
+from pix2pix_checkpoint import latest_complete_checkpoint
+
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def load_generator(checkpoint_dir):
+  # Generator restored from the latest training checkpoint in checkpoint_dir,
+  # built with the config saved next to it.
+  generator = Generator(**load_model_config(checkpoint_dir)['generator'])
+  latest = latest_complete_checkpoint(checkpoint_dir)
+  if latest is None:
+    raise ValueError('No checkpoint found in {}'.format(checkpoint_dir))
+  # the training checkpoint also holds the discriminator and optimizers
+  tf.train.Checkpoint(generator=generator).restore(latest).expect_partial()
+  return generator
+
+
+def list_inputs(input_dir):
+  files = []
+  for pattern in IMAGE_PATTERNS:
+    files += glob.glob(os.path.join(input_dir, pattern))
+  return sorted(files)
+
+
+def output_path(image_file, output_dir):
+  name = os.path.splitext(os.path.basename(image_file))[0]
+  return os.path.join(output_dir, name + '.png')
+
+
+def load_input(image_file, paired=False):
+  # Input image scaled to the generator's size and [-1, 1]. With `paired` the
+  # file is a side by side training pair and its input (right) half is used.
+  image = tf.io.decode_image(tf.io.read_file(image_file), channels=3,
+                             expand_animations=False)
+  if paired:
+    w = tf.shape(image)[1] // 2
+    image = image[:, w:, :]
+
+  image = tf.image.resize(image, [IMG_HEIGHT, IMG_WIDTH],
+                          method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
+  return (tf.cast(image, tf.float32) / 127.5) - 1
+
+
+def inference_dataset(files, batch_size=32, paired=False):
+  dataset = tf.data.Dataset.from_tensor_slices(files)
+  dataset = dataset.map(lambda image_file: (image_file, load_input(image_file, paired)),
+                        num_parallel_calls=AUTOTUNE)
+  dataset = dataset.batch(batch_size)
+  return dataset.prefetch(AUTOTUNE)
+
+
+def to_uint8(images):
+  # [-1, 1] floats to [0, 255] uint8.
+  images = (tf.cast(images, tf.float32) + 1) * 127.5
+  return tf.cast(tf.clip_by_value(tf.round(images), 0, 255), tf.uint8)
+
+
+def write_png(path, image):
+  # Written under a temporary name first so an interrupted write never looks
+  # like a finished output.
+  temp_path = path + '.tmp'
+  tf.io.write_file(temp_path, tf.image.encode_png(image))
+  os.replace(temp_path, path)
+
+
+# ## Frozen BatchNorm
+#
+# Calling the generator with `training=True` (as generate_images does)
+# recomputes the BatchNorm statistics of every batch and applies Dropout, so
+# the output is random and depends on the batch it is in. In frozen mode the
+# BatchNorm statistics are fixed and folded into the preceding convolution:
+# every downsample/upsample block becomes a single (transposed) convolution
+# with a bias followed by its activation, and Dropout is removed.
+#
+# The fixed statistics are either the moving averages saved with the training
+# checkpoint, or a snapshot calibrated with `calibrate_batchnorm` on a sample of
+# training images, which matches the `training=True` output more closely.
+
+def batchnorm_layers(generator):
+  return [layer for block in generator.layers if isinstance(block, tf.keras.Sequential)
+          for layer in block.layers
+          if isinstance(layer, tf.keras.layers.BatchNormalization)]
+
+
+def calibrate_batchnorm(generator, images, batches=16):
+  # Sets each BatchNorm's moving mean and variance to the average of its batch
+  # statistics over `batches` batches of `images` run with `training=True`.
+  layers = batchnorm_layers(generator)
+  momentums = [layer.momentum for layer in layers]
+  try:
+    for n, batch in enumerate(images.take(batches)):
+      # momentum n/(n+1) turns the moving average into a plain running mean
+      for layer in layers:
+        layer.momentum = n / (n + 1.0)
+      generator(batch, training=True)
+  finally:
+    for layer, momentum in zip(layers, momentums):
+      layer.momentum = momentum
+
+
+def fold_block(block):
+  # A downsample/upsample Sequential with the BatchNorm folded into the
+  # convolution and Dropout removed.
+  conv = block.layers[0]
+  activation = block.layers[-1]
+  batchnorm = [layer for layer in block.layers
+               if isinstance(layer, tf.keras.layers.BatchNormalization)]
+  transpose = isinstance(conv, tf.keras.layers.Conv2DTranspose)
+
+  kernel = conv.kernel.numpy()
+  # output channels are the last kernel axis of Conv2D and the third of
+  # Conv2DTranspose
+  in_channels, out_channels = (kernel.shape[3], kernel.shape[2]) if transpose else kernel.shape[2:]
+  bias = conv.bias.numpy() if conv.use_bias else np.zeros(out_channels, kernel.dtype)
+  if batchnorm:
+    batchnorm = batchnorm[0]
+    mean = batchnorm.moving_mean.numpy()
+    variance = batchnorm.moving_variance.numpy()
+    gamma = batchnorm.gamma.numpy() if batchnorm.scale else 1.
+    beta = batchnorm.beta.numpy() if batchnorm.center else 0.
+
+    scale = gamma / (variance + batchnorm.epsilon) ** 0.5
+    kernel = kernel * (scale[:, None] if transpose else scale)
+    bias = beta + (bias - mean) * scale
+
+  config = conv.get_config()
+  config.pop('name')
+  config['use_bias'] = True
+  folded = conv.__class__.from_config(config)
+  folded.build((None, None, None, in_channels))
+  folded.set_weights([kernel, bias])
+
+  return tf.keras.Sequential([folded, activation])
+
+
+def fold_batchnorm(generator):
+  # Inference-only copy of `generator` with every block folded. Layers
+  # without BatchNorm (the concatenations and the last layer) are shared.
+  def clone(layer):
+    if isinstance(layer, tf.keras.Sequential):
+      return fold_block(layer)
+    return layer
+
+  return tf.keras.models.clone_model(generator, clone_function=clone)
+
+
+def compare_frozen(generator, folded, images, batches=4, tolerance=None):
+  # Mean absolute difference and PSNR of the folded generator's output against
+  # `generator` with training=True (the current preview path) and
+  # training=False (what was folded), plus the latency of each path.
+  def psnr(a, b):
+    return float(tf.reduce_mean(tf.image.psnr(a, b, max_val=2.0)))
+
+  reference = tf.function(lambda x: generator(x, training=True))
+  # training=True also updates the moving statistics, which are put back
+  # straight after every reference call, before training=False uses them
+  layers = batchnorm_layers(generator)
+  statistics = [(layer.moving_mean.numpy(), layer.moving_variance.numpy()) for layer in layers]
+
+  def restore_statistics():
+    for layer, (mean, variance) in zip(layers, statistics):
+      layer.moving_mean.assign(mean)
+      layer.moving_variance.assign(variance)
+
+  unfolded = tf.function(lambda x: generator(x, training=False))
+  frozen = tf.function(lambda x: folded(x, training=False))
+
+  results = {'l1_vs_training': 0., 'psnr_vs_training': 0., 'l1_vs_unfolded': 0.,
+             'ms_per_image_training': 0., 'ms_per_image_frozen': 0.}
+  count = 0
+  for n, batch in enumerate(images.take(batches + 1)):
+    timings = []
+    outputs = []
+    for fn in (reference, unfolded, frozen):
+      start = time.perf_counter()
+      outputs.append(fn(batch).numpy())
+      timings.append(time.perf_counter() - start)
+      if fn is reference:
+        restore_statistics()
+    if n == 0:
+      # first batch traces the functions
+      continue
+
+    size = int(batch.shape[0])
+    count += size
+    results['l1_vs_training'] += float(tf.reduce_mean(tf.abs(outputs[2] - outputs[0]))) * size
+    results['psnr_vs_training'] += psnr(outputs[2], outputs[0]) * size
+    results['l1_vs_unfolded'] += float(tf.reduce_mean(tf.abs(outputs[2] - outputs[1]))) * size
+    results['ms_per_image_training'] += 1000. * timings[0]
+    results['ms_per_image_frozen'] += 1000. * timings[2]
+
+  for key in results:
+    results[key] /= max(count, 1)
+  if tolerance is not None:
+    results['within_tolerance'] = results['l1_vs_training'] <= tolerance
+  return results
+
+
+# Note: `training=True` matches generate_images in pix2pixKT.py, which uses
+# the batch statistics on purpose. Use a folded generator with training=False
+# for the frozen mode.
+
+def make_translate(generator, training=True):
+  @tf.function(reduce_retracing=True)
+  def translate(images):
+    return to_uint8(generator(images, training=training))
+  return translate
+
+
+def translate_files(translate, files, output_dir, batch_size=32, paired=False,
+                    writers=8, report_every=10):
+  # Translates `files` into PNGs in output_dir, skipping files that already
+  # have an output, and returns (images translated, seconds taken).
+  os.makedirs(output_dir, exist_ok=True)
+  files = [f for f in files if not os.path.exists(output_path(f, output_dir))]
+  if not files:
+    return 0, 0.0
+
+  start = time.time()
+  count = 0
+  with concurrent.futures.ThreadPoolExecutor(max_workers=writers) as pool:
+    pending = []
+    for n, (image_files, images) in enumerate(inference_dataset(files, batch_size, paired)):
+      outputs = translate(images)
+
+      # keep at most a couple of batches queued up in the writers
+      pending = [f for f in pending if not f.done()]
+      while len(pending) > 2 * batch_size:
+        pending.pop(0).result()
+
+      for image_file, output in zip(image_files.numpy(), outputs):
+        path = output_path(image_file.decode('utf-8'), output_dir)
+        pending.append(pool.submit(write_png, path, output))
+      count += len(outputs)
+
+      if (n + 1) % report_every == 0:
+        print('{} / {} images, {:.1f} images/sec'.format(
+            count, len(files), count / (time.time() - start)))
+
+    for future in pending:
+      future.result()
+
+  return count, time.time() - start
+
+
+# ## Tiled inference
+#
+# The generator only takes IMG_HEIGHT x IMG_WIDTH inputs. Larger images are
+# split into overlapping tiles of that size, the tiles are translated in
+# batches and the overlaps are blended with a feathered window (weights ramp
+# down linearly over the overlap), which hides the seams.
+#
+# Tiles are processed one row of tiles at a time, and output rows are
+# finished and handed on as soon as no later tile can touch them, so the
+# float accumulator is only ever one tile high, however big the image is.
+
+def tile_positions(length, tile, overlap):
+  # Start offsets of tiles of size `tile` covering `length`, overlapping by at
+  # least `overlap`; the last tile is flush with the end.
+  if not 0 <= overlap < tile:
+    raise ValueError('overlap must be at least 0 and less than the tile size {}, got {}'.format(
+        tile, overlap))
+  if length <= tile:
+    return [0]
+  stride = tile - overlap
+  positions = list(range(0, length - tile, stride))
+  return positions + [length - tile]
+
+
+def feather_ramp(tile, overlap):
+  ramp = np.minimum(np.arange(1, tile + 1), np.arange(tile, 0, -1)) / float(overlap + 1)
+  return np.minimum(ramp, 1.).astype(np.float32)
+
+
+def feather_window(height, width, overlap):
+  return np.outer(feather_ramp(height, overlap), feather_ramp(width, overlap))
+
+
+def translate_tiled_rows(model_fn, image, overlap=64, batch_size=8):
+  # Translates a uint8 [H, W, 3] image of any size with `model_fn` (a batch of
+  # [-1, 1] IMG_HEIGHT x IMG_WIDTH tiles in, translated tiles out) and yields
+  # (first row, uint8 rows) blocks of the output from top to bottom.
+  height, width = image.shape[:2]
+  # images smaller than a tile are padded up to one
+  pad_height, pad_width = max(IMG_HEIGHT - height, 0), max(IMG_WIDTH - width, 0)
+  if pad_height or pad_width:
+    image = np.pad(image, [(0, pad_height), (0, pad_width), (0, 0)], mode='edge')
+  padded_height, padded_width = image.shape[:2]
+
+  window = feather_window(IMG_HEIGHT, IMG_WIDTH, overlap)
+  columns = tile_positions(padded_width, IMG_WIDTH, overlap)
+
+  accumulator = np.zeros([IMG_HEIGHT, padded_width, 3], np.float32)
+  weights = np.zeros([IMG_HEIGHT, padded_width, 1], np.float32)
+  top = 0
+
+  def finish(rows):
+    block = accumulator[:rows] / weights[:rows]
+    block = np.clip(np.round((block + 1) * 127.5), 0, 255).astype(np.uint8)
+    return block[:, :width]
+
+  for y in tile_positions(padded_height, IMG_HEIGHT, overlap):
+    if y > top:
+      # rows above y are complete: hand them on and shift the accumulator up
+      done = y - top
+      rows = min(done, height - top)
+      if rows > 0:
+        yield top, finish(rows)
+      accumulator[:-done] = accumulator[done:]
+      accumulator[-done:] = 0
+      weights[:-done] = weights[done:]
+      weights[-done:] = 0
+      top = y
+
+    for start in range(0, len(columns), batch_size):
+      xs = columns[start:start + batch_size]
+      tiles = np.stack([image[y:y + IMG_HEIGHT, x:x + IMG_WIDTH] for x in xs])
+      tiles = (tiles.astype(np.float32) / 127.5) - 1
+      outputs = np.asarray(model_fn(tf.constant(tiles)))
+      for x, output in zip(xs, outputs):
+        accumulator[:, x:x + IMG_WIDTH] += output * window[..., None]
+        weights[:, x:x + IMG_WIDTH] += window[..., None]
+
+  rows = min(IMG_HEIGHT, height - top)
+  if rows > 0:
+    yield top, finish(rows)
+
+
+def translate_tiled(model_fn, image, overlap=64, batch_size=8):
+  # translate_tiled_rows collected into one uint8 image.
+  output = np.zeros([image.shape[0], image.shape[1], 3], np.uint8)
+  for top, rows in translate_tiled_rows(model_fn, image, overlap, batch_size):
+    output[top:top + len(rows)] = rows
+  return output
+
+
+def make_tile_model_fn(generator, training=False):
+  @tf.function(reduce_retracing=True)
+  def model_fn(tiles):
+    return generator(tiles, training=training)
+  return model_fn
+
+
+def translate_files_tiled(model_fn, files, output_dir, overlap=64, batch_size=8):
+  # Full resolution version of translate_files, one image at a time.
+  os.makedirs(output_dir, exist_ok=True)
+  files = [f for f in files if not os.path.exists(output_path(f, output_dir))]
+
+  start = time.time()
+  for n, image_file in enumerate(files):
+    image = tf.io.decode_image(tf.io.read_file(image_file), channels=3,
+                               expand_animations=False).numpy()
+    output = translate_tiled(model_fn, image, overlap, batch_size)
+    write_png(output_path(image_file, output_dir), output)
+    print('{} / {} images, {:.2f} images/sec'.format(n + 1, len(files),
+                                                     (n + 1) / (time.time() - start)))
+
+  return len(files), time.time() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Translate a folder of images with a trained pix2pix generator')
+  parser.add_argument('checkpoint_dir', help='training checkpoint directory')
+  parser.add_argument('input_dir')
+  parser.add_argument('output_dir')
+  parser.add_argument('--batch-size', type=int, default=32)
+  parser.add_argument('--writers', type=int, default=8, help='PNG writer threads')
+  parser.add_argument('--paired', action='store_true',
+                      help='inputs are side by side training pairs, use their input half')
+  parser.add_argument('--frozen-bn', action='store_true',
+                      help='fold BatchNorm into the convolutions and disable Dropout')
+  parser.add_argument('--calibrate', metavar='PATTERN',
+                      help="with --frozen-bn, calibrate BatchNorm on these side by side "
+                           "training pairs, e.g. 'dataSet/train/*.jpg'")
+  parser.add_argument('--calibration-batches', type=int, default=16)
+  parser.add_argument('--compare', type=int, metavar='BATCHES',
+                      help='with --frozen-bn, report the difference to training=True on '
+                           'this many batches of the inputs before translating')
+  parser.add_argument('--tiled', action='store_true',
+                      help='translate at full resolution in overlapping tiles instead of '
+                           'resizing to the generator size (use with --frozen-bn)')
+  parser.add_argument('--overlap', type=int, default=64, help='tile overlap in pixels')
+  args = parser.parse_args()
+
+  if args.tiled and not 0 <= args.overlap < min(IMG_HEIGHT, IMG_WIDTH):
+    parser.error('--overlap must be at least 0 and less than {}'.format(min(IMG_HEIGHT, IMG_WIDTH)))
+
+  generator = load_generator(args.checkpoint_dir)
+  files = list_inputs(args.input_dir)
+
+  if args.frozen_bn:
+    if args.calibrate:
+      calibration = inference_dataset(sorted(glob.glob(args.calibrate)), args.batch_size,
+                                      paired=True)
+      calibrate_batchnorm(generator, calibration.map(lambda _, images: images),
+                          args.calibration_batches)
+    folded = fold_batchnorm(generator)
+    if args.compare:
+      images = inference_dataset(files, args.batch_size, args.paired).map(
+          lambda _, images: images)
+      print(compare_frozen(generator, folded, images, args.compare))
+    generator, training = folded, False
+  else:
+    training = True
+
+  if args.tiled:
+    model_fn = make_tile_model_fn(generator, training)
+    count, seconds = translate_files_tiled(model_fn, files, args.output_dir, args.overlap,
+                                           args.batch_size)
+  else:
+    translate = make_translate(generator, training)
+    count, seconds = translate_files(translate, files, args.output_dir, args.batch_size,
+                                     args.paired, args.writers)
+  print('Translated {} of {} images in {:.1f} sec ({:.1f} images/sec)'.format(
+      count, len(files), seconds, count / seconds if seconds else 0.0))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Buffered TensorBoard logging of the pix2pix training losses.
+#
+# train_step only adds the step's losses to running sums kept in variables
+# (on the device) and bumps a global step counter. Every `every_n_steps`
+# steps the training loop calls `maybe_write()`, which snapshots the means,
+# resets the sums and hands the snapshot to a background thread that writes
+# the summaries, so there is no summary I/O in the compiled step or on the
+# training thread.
+#
+# Evaluator computes L1, PSNR and SSIM of the generator on a fixed test set.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import tensorflow as tf
+
+import concurrent.futures
+import time
+
+
+LOSS_NAMES = ('gen_total_loss', 'gen_gan_loss', 'gen_l1_loss', 'disc_loss')
+
+
+class LossLogger(object):
+  # Under a tf.distribute strategy create it in the strategy's scope; the
+  # sums are then averaged over the replicas. log_dir=None writes nothing,
+  # for the workers other than the chief.
+
+  def __init__(self, log_dir, names=LOSS_NAMES, every_n_steps=100, flush_secs=30):
+    self.names = names
+    self.every_n_steps = every_n_steps
+
+    if log_dir is None:
+      self.writer = tf.summary.create_noop_writer()
+    else:
+      self.writer = tf.summary.create_file_writer(log_dir, flush_millis=flush_secs * 1000)
+    self.step = tf.Variable(0, dtype=tf.int64, trainable=False, name='global_step',
+                            aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+    self.sums = tf.Variable(tf.zeros([len(names)]), trainable=False, name='loss_sums',
+                            aggregation=tf.VariableAggregation.MEAN)
+    self.count = tf.Variable(0., trainable=False, name='loss_count',
+                             aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+
+    self.steps_since_write = 0
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self.pending = None
+
+  def update(self, *losses):
+    # Called inside train_step with the step's losses, in `names` order.
+    self.sums.assign_add(tf.stack([tf.cast(loss, tf.float32) for loss in losses]))
+    self.count.assign_add(1.)
+    self.step.assign_add(1)
+
+  def maybe_write(self, steps=1, force=False):
+    # Called by the training loop after every `steps` steps. Counting steps in
+    # Python means nothing is read back from the device until it's time to
+    # write.
+    self.steps_since_write += steps
+    if not force and self.steps_since_write < self.every_n_steps:
+      return
+    self.steps_since_write = 0
+
+    # these are enqueued, not waited for; the writer thread reads them
+    means = self.sums / tf.maximum(self.count, 1.)
+    step = tf.identity(self.step)
+    self.sums.assign(tf.zeros_like(self.sums))
+    self.count.assign(0.)
+
+    if self.pending is not None:
+      self.pending.result()
+    self.pending = self.executor.submit(self._write, means, step)
+
+  def _write(self, means, step):
+    means = means.numpy()
+    step = int(step.numpy())
+    with self.writer.as_default():
+      for name, value in zip(self.names, means):
+        tf.summary.scalar(name, value, step=step)
+
+  def flush(self):
+    # Writes whatever has accumulated since the last write and waits for it.
+    if self.steps_since_write:
+      self.maybe_write(0, force=True)
+    if self.pending is not None:
+      self.pending.result()
+      self.pending = None
+    self.writer.flush()
+
+
+EVAL_METRIC_NAMES = ('eval_l1', 'eval_psnr', 'eval_ssim')
+
+
+def image_metrics(target, prediction):
+  # Per image L1, PSNR and SSIM of [-1, 1] images, as a [batch, 3] tensor.
+  target = tf.cast(target, tf.float32)
+  prediction = tf.cast(prediction, tf.float32)
+  l1 = tf.reduce_mean(tf.abs(target - prediction), axis=[1, 2, 3])
+  psnr = tf.image.psnr(target, prediction, max_val=2.0)
+  ssim = tf.image.ssim(target, prediction, max_val=2.0)
+  return tf.stack([l1, psnr, ssim], axis=1)
+
+
+class Evaluator(object):
+  # Every `every_n_steps` steps runs `model` over the whole of `dataset`, a
+  # batched dataset of (input_image, target) pairs, with `training=False`,
+  # and writes the mean of each metric to `writer`.
+
+  def __init__(self, model, dataset, writer, every_n_steps=None, names=EVAL_METRIC_NAMES):
+    self.dataset = dataset
+    self.writer = writer
+    self.every_n_steps = every_n_steps
+    self.names = names
+    self.last_step = None
+
+    @tf.function
+    def batch_sums(input_image, target):
+      prediction = model(input_image, training=False)
+      return tf.reduce_sum(image_metrics(target, prediction), axis=0), tf.shape(input_image)[0]
+    self.batch_sums = batch_sums
+
+  def evaluate(self):
+    # Returns {name: mean over the dataset}.
+    sums = tf.zeros([len(self.names)])
+    count = 0
+    for input_image, target in self.dataset:
+      batch_sums, batch_count = self.batch_sums(input_image, target)
+      sums += batch_sums
+      count += batch_count
+    means = (sums / tf.cast(tf.maximum(count, 1), tf.float32)).numpy()
+    return dict(zip(self.names, means.tolist()))
+
+  def maybe_evaluate(self, step):
+    # Called by the training loop as often as it likes. Returns the metrics
+    # when it evaluated, otherwise None.
+    if self.every_n_steps is None:
+      return None
+    if self.last_step is not None and step - self.last_step < self.every_n_steps:
+      return None
+    return self.evaluate_and_write(step)
+
+  def evaluate_and_write(self, step):
+    self.last_step = step
+    metrics = self.evaluate()
+    with self.writer.as_default():
+      for name in self.names:
+        tf.summary.scalar(name, metrics[name], step=step)
+    print('step {}: '.format(step) +
+          ', '.join('{} {:.4f}'.format(name, metrics[name]) for name in self.names))
+    return metrics
+
+
+class ProgressReporter(object):
+  # Prints a one line progress report at most every `every_secs` seconds,
+  # instead of a '.' per step.
+
+  def __init__(self, every_secs=30):
+    self.every_secs = every_secs
+    self.start = self.last = time.time()
+    self.steps = 0
+    self.images = 0
+
+  def update(self, steps, images):
+    self.steps += steps
+    self.images += images
+    now = time.time()
+    if now - self.last >= self.every_secs:
+      self.last = now
+      self.report(now)
+
+  def report(self, now=None):
+    elapsed = max((now or time.time()) - self.start, 1e-9)
+    print('step {}: {:.2f} steps/sec, {:.1f} images/sec'.format(
+        self.steps, self.steps / elapsed, self.images / elapsed))
+
+  def done(self):
+    self.report()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# pix2pix generator, discriminator and losses.
+#
+# Importing this module only defines functions; nothing is built until
+# Generator() / Discriminator() are called.
+#
+# Run as a script it reports the parameters, FLOPs and activation memory of a
+# range of configurations:
+#
+#   python pix2pix_model.py generator --sizes 256,512 --max-filters 512,1024
+#   python pix2pix_model.py discriminator --downsamples 3,4,5 --base-filters 32,64
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import tensorflow as tf
+
+import argparse
+import json
+import os
+
+from pix2pix_data import IMG_WIDTH, IMG_HEIGHT
+
+
+# ## Build the Generator
+#   * The architecture of generator is a modified U-Net.
+#   * Each block in the encoder is (Conv -> Batchnorm -> Leaky ReLU)
+#   * Each block in the decoder is (Transposed Conv -> Batchnorm -> Dropout(applied to the first 3 blocks) -> ReLU)
+#   * There are skip connections between the encoder and decoder (as in U-Net).
+#   * The encoder halves the resolution `num_downsamples` times (by default down to 1x1, 9 blocks at 512x512), the filters doubling from base_filters up to max_filters. The decoder mirrors it, each of its blocks but the last concatenated with the encoder output of the same resolution.
+
+OUTPUT_CHANNELS = 3
+
+
+def downsample(filters, size, apply_batchnorm=True):
+  initializer = tf.random_normal_initializer(0., 0.02)
+
+  result = tf.keras.Sequential()
+  result.add(
+      tf.keras.layers.Conv2D(filters, size, strides=2, padding='same',
+                             kernel_initializer=initializer, use_bias=False))
+
+  if apply_batchnorm:
+    result.add(tf.keras.layers.BatchNormalization())
+
+  result.add(tf.keras.layers.LeakyReLU())
+
+  return result
+
+
+def upsample(filters, size, apply_dropout=False):
+  initializer = tf.random_normal_initializer(0., 0.02)
+
+  result = tf.keras.Sequential()
+  result.add(
+    tf.keras.layers.Conv2DTranspose(filters, size, strides=2,
+                                    padding='same',
+                                    kernel_initializer=initializer,
+                                    use_bias=False))
+
+  result.add(tf.keras.layers.BatchNormalization())
+
+  if apply_dropout:
+      result.add(tf.keras.layers.Dropout(0.5))
+
+  result.add(tf.keras.layers.ReLU())
+
+  return result
+
+
+def full_depth(height, width):
+  # downsamples that take the smaller side down to 1
+  side = min(height, width)
+  depth = 0
+  while side > 1:
+    side //= 2
+    depth += 1
+  return depth
+
+
+def Generator(height=IMG_HEIGHT, width=IMG_WIDTH, base_filters=32, max_filters=1024,
+              num_downsamples=None, dropout_blocks=3, output_channels=OUTPUT_CHANNELS):
+  # The defaults build the generator the existing checkpoints were trained
+  # with: 32 -> 1024 filters over 9 blocks at 512x512.
+  if num_downsamples is None:
+    num_downsamples = full_depth(height, width)
+  if height % 2**num_downsamples or width % 2**num_downsamples:
+    raise ValueError('{}x{} does not halve {} times'.format(height, width, num_downsamples))
+
+  inputs = tf.keras.layers.Input(shape=[height, width, 3])
+
+  filters = [min(base_filters * 2**i, max_filters) for i in range(num_downsamples)]
+
+  # (bs, 256, 256, 32), (bs, 128, 128, 64), ... (bs, 1, 1, 1024) at 512x512
+  down_stack = [downsample(f, 4, apply_batchnorm=i > 0) for i, f in enumerate(filters)]
+
+  # back up to the second encoder block's resolution and filters, the last
+  # layer does the final 2x
+  up_stack = [upsample(f, 4, apply_dropout=i < dropout_blocks)
+              for i, f in enumerate(reversed(filters[:-1]))]
+
+  initializer = tf.random_normal_initializer(0., 0.02)
+  # float32 even under a mixed precision policy, so the tanh output and the
+  # L1 loss on it keep full precision
+  last = tf.keras.layers.Conv2DTranspose(output_channels, 4,
+                                         strides=2,
+                                         padding='same',
+                                         kernel_initializer=initializer,
+                                         activation='tanh',
+                                         dtype='float32') # (bs, 512, 512, 3)
+
+  x = inputs
+
+  # Downsampling through the model
+  skips = []
+  for down in down_stack:
+    x = down(x)
+    skips.append(x)
+
+  skips = reversed(skips[:-1])
+
+  # Upsampling and establishing the skip connections
+  for up, skip in zip(up_stack, skips):
+    x = up(x)
+    x = tf.keras.layers.Concatenate()([x, skip])
+  x = last(x)
+
+  return tf.keras.Model(inputs=inputs, outputs=x)
+
+
+# * **Generator loss**
+#   * It is a sigmoid cross entropy loss of the generated images and an **array of ones**.
+#   * The [paper](https://arxiv.org/abs/1611.07004) also includes L1 loss which is MAE (mean absolute error) between the generated image and the target image.
+#   * This allows the generated image to become structurally similar to the target image.
+#   * The formula to calculate the total generator loss = gan_loss + LAMBDA * l1_loss, where LAMBDA = 100. This value was decided by the authors of the [paper](https://arxiv.org/abs/1611.07004).
+
+LAMBDA = 100
+
+
+loss_object = tf.keras.losses.BinaryCrossentropy(from_logits=True)
+
+
+def generator_loss(disc_generated_output, gen_output, target):
+  gan_loss = loss_object(tf.ones_like(disc_generated_output), disc_generated_output)
+
+  # mean absolute error
+  l1_loss = tf.reduce_mean(tf.abs(target - gen_output))
+
+  total_gen_loss = gan_loss + (LAMBDA * l1_loss)
+
+  return total_gen_loss, gan_loss, l1_loss
+
+
+# ## Build the Discriminator
+#   * The Discriminator is a PatchGAN.
+#   * Each block in the discriminator is (Conv -> BatchNorm -> Leaky ReLU)
+#   * `num_downsamples` stride 2 blocks, then a stride 1 block and a stride 1 conv to one channel of logits.
+#   * The shape of the output after the last layer is (batch_size, 30, 30, 1) at 512x512 with the default 4 blocks.
+#   * Each output patch classifies a receptive_field(num_downsamples) square of the input: 142x142 with 4 blocks, 70x70 with 3.
+#   * Discriminator receives 2 inputs.
+#     * Input image and the target image, which it should classify as real.
+#     * Input image and the generated image (output of generator), which it should classify as fake.
+#     * We concatenate these 2 inputs together in the code (`tf.concat([inp, tar], axis=-1)`)
+
+def receptive_field(num_downsamples):
+  # Side of the input square each output logit sees. All the convs are 4x4.
+  field = 1
+  for stride in reversed([2] * num_downsamples + [1, 1]):
+    field = field * stride + (4 - stride)
+  return field
+
+
+def Discriminator(num_downsamples=4, base_filters=32, max_filters=512, min_receptive_field=None,
+                  height=IMG_HEIGHT, width=IMG_WIDTH):
+  # The filters double from base_filters every block, up to max_filters.
+  # min_receptive_field picks the fewest blocks whose patches are at least
+  # that big instead of num_downsamples. The defaults build the
+  # discriminator the existing checkpoints were trained with.
+  if min_receptive_field is not None:
+    num_downsamples = 0
+    while receptive_field(num_downsamples) < min_receptive_field:
+      num_downsamples += 1
+
+  initializer = tf.random_normal_initializer(0., 0.02)
+
+  inp = tf.keras.layers.Input(shape=[height, width, 3], name='input_image')
+  tar = tf.keras.layers.Input(shape=[height, width, 3], name='target_image')
+
+  x = tf.keras.layers.concatenate([inp, tar]) # (bs, 512, 512, channels*2)
+
+  for i in range(num_downsamples):
+    # (bs, 256, 256, 32), (bs, 128, 128, 64), (bs, 64, 64, 128), (bs, 32, 32, 256)
+    x = downsample(min(base_filters * 2**i, max_filters), 4, apply_batchnorm=i > 0)(x)
+
+  zero_pad1 = tf.keras.layers.ZeroPadding2D()(x) # (bs, 34, 34, 256)
+  conv = tf.keras.layers.Conv2D(min(base_filters * 2**num_downsamples, max_filters), 4, strides=1,
+                                kernel_initializer=initializer,
+                                use_bias=False)(zero_pad1) # (bs, 31, 31, 512)
+
+  batchnorm1 = tf.keras.layers.BatchNormalization()(conv)
+
+  leaky_relu = tf.keras.layers.LeakyReLU()(batchnorm1)
+
+  zero_pad2 = tf.keras.layers.ZeroPadding2D()(leaky_relu) # (bs, 33, 33, 512)
+
+  # the logits loss_object sees stay float32 under a mixed precision policy
+  last = tf.keras.layers.Conv2D(1, 4, strides=1,
+                                kernel_initializer=initializer,
+                                dtype='float32')(zero_pad2) # (bs, 30, 30, 1)
+
+  return tf.keras.Model(inputs=[inp, tar], outputs=last)
+
+
+# **Discriminator loss**
+#   * The discriminator loss function takes 2 inputs; **real images, generated images**
+#   * real_loss is a sigmoid cross entropy loss of the **real images** and an **array of ones(since these are the real images)**
+#   * generated_loss is a sigmoid cross entropy loss of the **generated images** and an **array of zeros(since these are the fake images)**
+#   * Then the total_loss is the sum of real_loss and the generated_loss
+
+def discriminator_loss(disc_real_output, disc_generated_output):
+  real_loss = loss_object(tf.ones_like(disc_real_output), disc_real_output)
+
+  generated_loss = loss_object(tf.zeros_like(disc_generated_output), disc_generated_output)
+
+  total_disc_loss = real_loss + generated_loss
+
+  return total_disc_loss
+
+
+# ## Model config
+#
+# The Generator() and Discriminator() keyword arguments a checkpoint was
+# trained with are kept in model_config.json next to it, so the models can be
+# rebuilt with the right shapes to restore it. A checkpoint directory without
+# the file was trained with the defaults.
+
+MODEL_CONFIG_FILE = 'model_config.json'
+
+
+def save_model_config(checkpoint_dir, generator_config, discriminator_config):
+  path = os.path.join(checkpoint_dir, MODEL_CONFIG_FILE)
+  tf.io.gfile.makedirs(checkpoint_dir)
+  with tf.io.gfile.GFile(path + '.tmp', 'w') as f:
+    json.dump({'generator': dict(generator_config),
+               'discriminator': dict(discriminator_config)}, f, indent=2, sort_keys=True)
+  tf.io.gfile.rename(path + '.tmp', path, overwrite=True)
+
+
+def load_model_config(checkpoint_dir):
+  # {'generator': {...}, 'discriminator': {...}}, empty for the defaults.
+  path = os.path.join(checkpoint_dir, MODEL_CONFIG_FILE)
+  config = {'generator': {}, 'discriminator': {}}
+  if tf.io.gfile.exists(path):
+    with tf.io.gfile.GFile(path) as f:
+      config.update(json.load(f))
+  return config
+
+
+# ## Cost
+#
+# Parameters and FLOPs per image, counting 2 FLOPs per multiply-add of the
+# convolutions and nothing for the cheap elementwise layers.
+
+def conv_flops(layer, input_shape, output_shape):
+  if isinstance(layer, tf.keras.layers.Conv2DTranspose):
+    positions = input_shape[1] * input_shape[2]
+  elif isinstance(layer, tf.keras.layers.Conv2D):
+    positions = output_shape[1] * output_shape[2]
+  else:
+    return 0
+  kernel_height, kernel_width = layer.kernel_size
+  return 2 * positions * kernel_height * kernel_width * input_shape[-1] * layer.filters
+
+
+def layer_costs(model):
+  # One (layer, input shapes, output shape, FLOPs) tuple per layer, going
+  # into the downsample / upsample Sequential blocks.
+  costs = []
+  for layer in model.layers:
+    if isinstance(layer, tf.keras.layers.InputLayer):
+      continue
+    inputs = layer.input if isinstance(layer.input, (list, tuple)) else [layer.input]
+    input_shapes = [tuple(x.shape) for x in inputs]
+    sublayers = layer.layers if isinstance(layer, tf.keras.Sequential) else [layer]
+    shape = input_shapes[0]
+    for sublayer in sublayers:
+      output_shape = tuple(sublayer.compute_output_shape(
+          input_shapes if len(input_shapes) > 1 else shape))
+      costs.append((sublayer, input_shapes if len(input_shapes) > 1 else [shape],
+                    output_shape, conv_flops(sublayer, shape, output_shape)))
+      shape = output_shape
+  return costs
+
+
+def activation_memory(model, bytes_per_element=4):
+  # Bytes per image of the layer outputs: (peak, total). peak is the most
+  # held at once by an inference forward pass, each output living from the
+  # layer that makes it to the last layer that reads it (the skips stay
+  # around until the decoder), plus the largest output inside a block.
+  # total is every output, which training keeps for the backward pass.
+  def size(shape):
+    elements = 1
+    for dim in shape[1:]:
+      elements *= dim
+    return elements * bytes_per_element
+
+  layers = [layer for layer in model.layers
+            if not isinstance(layer, tf.keras.layers.InputLayer)]
+  last_use = {}
+  for n, layer in enumerate(layers):
+    inputs = layer.input if isinstance(layer.input, (list, tuple)) else [layer.input]
+    for x in inputs:
+      last_use[id(x)] = n
+
+  live = {id(x): size(x.shape) for x in model.inputs}
+  peak = sum(live.values())
+  for n, layer in enumerate(layers):
+    inner = 0
+    if isinstance(layer, tf.keras.Sequential):
+      shape = tuple(layer.input.shape)
+      for sublayer in layer.layers[:-1]:
+        shape = tuple(sublayer.compute_output_shape(shape))
+        inner = max(inner, size(shape))
+    live[id(layer.output)] = size(layer.output.shape)
+    peak = max(peak, sum(live.values()) + inner)
+    for key in [key for key in live if last_use.get(key, len(layers)) <= n]:
+      del live[key]
+
+  total = sum(size(output_shape) for _, _, output_shape, _ in layer_costs(model))
+  return peak, total
+
+
+def model_cost(model, bytes_per_element=4):
+  peak, total = activation_memory(model, bytes_per_element)
+  return {
+    'parameters': model.count_params(),
+    'flops': sum(flops for _, _, _, flops in layer_costs(model)),
+    'peak_activation_bytes': peak,
+    'training_activation_bytes': total,
+  }
+
+
+def int_list(value):
+  return [int(v) for v in value.split(',')]
+
+
+def main():
+  parser = argparse.ArgumentParser(description='pix2pix model cost report')
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  discriminator_parser = subparsers.add_parser(
+      'discriminator', help='parameters and FLOPs of Discriminator configurations')
+  discriminator_parser.add_argument('--size', type=int, default=IMG_HEIGHT,
+                                    help='square input size')
+  discriminator_parser.add_argument('--downsamples', type=int_list, default=[3, 4, 5])
+  discriminator_parser.add_argument('--base-filters', type=int_list, default=[32, 64])
+  discriminator_parser.add_argument('--max-filters', type=int_list, default=[512])
+
+  generator_parser = subparsers.add_parser(
+      'generator', help='parameters, FLOPs and activation memory of Generator configurations')
+  generator_parser.add_argument('--sizes', type=int_list, default=[256, 512],
+                                help='square input sizes')
+  generator_parser.add_argument('--base-filters', type=int_list, default=[32])
+  generator_parser.add_argument('--max-filters', type=int_list, default=[256, 512, 1024])
+  generator_parser.add_argument('--downsamples', type=int_list, default=None,
+                                help='encoder depths, by default down to 1x1')
+  generator_parser.add_argument('--bytes-per-element', type=int, default=4,
+                                help='4 for float32, 2 for mixed precision')
+
+  args = parser.parse_args()
+
+  if args.command == 'generator':
+    print('{:>5s} {:>5s} {:>5s} {:>6s} {:>12s} {:>8s} {:>14s} {:>15s}'.format(
+        'size', 'base', 'max', 'depth', 'parameters', 'GFLOPs', 'peak act. MB', 'train act. MB'))
+    for size in args.sizes:
+      for num_downsamples in args.downsamples or [full_depth(size, size)]:
+        for base_filters in args.base_filters:
+          for max_filters in args.max_filters:
+            model = Generator(size, size, base_filters, max_filters, num_downsamples)
+            cost = model_cost(model, args.bytes_per_element)
+            print('{:>5d} {:>5d} {:>5d} {:>6d} {:>12,d} {:>8.2f} {:>14.1f} {:>15.1f}'.format(
+                size, base_filters, max_filters, num_downsamples, cost['parameters'],
+                cost['flops'] / 1e9, cost['peak_activation_bytes'] / 1e6,
+                cost['training_activation_bytes'] / 1e6))
+            del model
+            tf.keras.backend.clear_session()
+
+  elif args.command == 'discriminator':
+    print('{:>11s} {:>5s} {:>4s} {:>15s} {:>7s} {:>12s} {:>10s}'.format(
+        'downsamples', 'base', 'max', 'receptive field', 'patches', 'parameters', 'GFLOPs'))
+    for num_downsamples in args.downsamples:
+      for base_filters in args.base_filters:
+        for max_filters in args.max_filters:
+          model = Discriminator(num_downsamples, base_filters, max_filters,
+                                height=args.size, width=args.size)
+          cost = model_cost(model)
+          patches = '{}x{}'.format(*model.output.shape[1:3])
+          print('{:>11d} {:>5d} {:>4d} {:>15d} {:>7s} {:>12,d} {:>10.2f}'.format(
+              num_downsamples, base_filters, max_filters, receptive_field(num_downsamples),
+              patches, cost['parameters'], cost['flops'] / 1e9))
+
+
+if __name__ == '__main__':
+  main()
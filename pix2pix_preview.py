@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Training previews without matplotlib.
+#
+# PreviewWriter takes a fixed set of test examples once, and every
+# `every_n_steps` training steps runs the generator on them and hands the
+# tensors to a background thread. That thread lays out one row per example,
+# input | ground truth | prediction, with plain numpy and writes it as a PNG,
+# so the training thread only pays for the forward pass. The same examples
+# every time make the previews comparable from one to the next.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import tensorflow as tf
+
+import concurrent.futures
+import os
+
+from pix2pix_infer import write_png, batchnorm_layers
+
+
+def take_examples(dataset, count):
+  # The first `count` (input_image, target) pairs of a batched dataset, as
+  # two [count, H, W, 3] tensors.
+  inputs, targets = [], []
+  for input_image, target in dataset.unbatch().take(count):
+    inputs.append(input_image)
+    targets.append(target)
+  return tf.stack(inputs), tf.stack(targets)
+
+
+def to_uint8(images):
+  # [-1, 1] floats to [0, 255] uint8
+  images = (np.asarray(images, dtype=np.float32) + 1) * 127.5
+  return np.clip(np.round(images), 0, 255).astype(np.uint8)
+
+
+def compose_grid(columns, padding=4):
+  # `columns` is a list of [N, H, W, C] image batches of the same shape; the
+  # grid has a row per image and a column per batch, `padding` pixels apart.
+  columns = [to_uint8(column) for column in columns]
+  count, height, width, channels = columns[0].shape
+  grid = np.full((count * height + (count - 1) * padding,
+                  len(columns) * width + (len(columns) - 1) * padding,
+                  channels), 255, np.uint8)
+  for j, column in enumerate(columns):
+    for i in range(count):
+      y = i * (height + padding)
+      x = j * (width + padding)
+      grid[y:y + height, x:x + width] = column[i]
+  return grid
+
+
+class PreviewWriter(object):
+  # `training=True` is intentional, as in generate_images: the previews use
+  # the batch statistics of the preview examples rather than the moving
+  # averages. It also updates the moving averages with the preview examples,
+  # so they are put back straight after the forward pass.
+
+  def __init__(self, model, inputs, targets, output_dir, every_n_steps=None, training=True):
+    self.inputs = inputs
+    self.targets = targets
+    self.output_dir = output_dir
+    self.every_n_steps = every_n_steps
+    self.last_step = None
+    layers = batchnorm_layers(model) if training else []
+
+    @tf.function
+    def predict(images):
+      statistics = [(tf.identity(layer.moving_mean), tf.identity(layer.moving_variance))
+                    for layer in layers]
+      prediction = model(images, training=training)
+      with tf.control_dependencies([prediction]):
+        for layer, (mean, variance) in zip(layers, statistics):
+          layer.moving_mean.assign(mean)
+          layer.moving_variance.assign(variance)
+      return prediction
+
+    self.predict = predict
+
+    os.makedirs(output_dir, exist_ok=True)
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self.pending = None
+
+  def maybe_write(self, step):
+    # Called by the training loop as often as it likes; previews once
+    # `every_n_steps` steps have passed since the last preview.
+    if self.every_n_steps is None:
+      return
+    if self.last_step is not None and step - self.last_step < self.every_n_steps:
+      return
+    self.write(step)
+
+  def write(self, step):
+    # Runs the generator now and writes <step>.png in the background.
+    self.last_step = step
+    prediction = self.predict(self.inputs)
+    self.wait()
+    path = os.path.join(self.output_dir, '{:07d}.png'.format(step))
+    self.pending = self.executor.submit(self._write, path, prediction)
+
+  def _write(self, path, prediction):
+    # .numpy() here, not on the training thread, waits for the forward pass
+    grid = compose_grid([self.inputs.numpy(), self.targets.numpy(), prediction.numpy()])
+    write_png(path, grid)
+
+  def wait(self):
+    if self.pending is not None:
+      pending, self.pending = self.pending, None
+      pending.result()
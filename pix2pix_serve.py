@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Local HTTP inference server for an exported pix2pix generator.
+#
+# Loads a model written by pix2pix_export.py (the SavedModel directory or a
+# .tflite file) once and translates images posted to /translate, answering
+# with a PNG:
+#
+#   python pix2pix_serve.py serve export/saved_model --port 8500
+#   curl --data-binary @frame.jpg localhost:8500/translate > out.png
+#
+# Requests that arrive together are batched: the batching thread takes the
+# first waiting image, then keeps collecting until it has --max-batch-size
+# images or --max-wait-ms has passed, and runs one forward pass for the
+# batch. Decoding and PNG encoding happen on the request threads, so they
+# overlap with the forward pass. PNGs are written with zlib level 1 by
+# default (--png-compression): the default level takes around ten times as
+# long for files only ~15% smaller. /metrics returns request latency
+# percentiles, the queue depth and the mean batch size as JSON.
+#
+# The server runs on the CPU unless --gpu is given. The loadtest command posts
+# an image from a number of concurrent clients and reports the latency and
+# throughput it saw:
+#
+#   python pix2pix_serve.py loadtest http://localhost:8500 frame.jpg \
+#       --concurrency 8 --requests 200
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import tensorflow as tf
+
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+from pix2pix_data import IMG_WIDTH, IMG_HEIGHT
+from pix2pix_export import make_runner
+
+
+def decode_request(data):
+  # Encoded image bytes to a uint8 [H, W, 3] array at the generator's size.
+  image = tf.io.decode_image(data, channels=3, expand_animations=False)
+  image = tf.image.resize(image, [IMG_HEIGHT, IMG_WIDTH],
+                          method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
+  return tf.cast(image, tf.uint8).numpy()
+
+
+def percentiles(values, points=(50, 90, 99)):
+  if not values:
+    return {'p{}'.format(point): None for point in points}
+  return {'p{}'.format(point): float(np.percentile(values, point)) for point in points}
+
+
+class Batcher(object):
+  # Runs `runner` (uint8 [N, H, W, 3] in, uint8 out) on batches of the images
+  # passed to translate() from any number of threads. A batch is sent once it
+  # has `max_batch_size` images or `max_wait_ms` after its first image
+  # arrived, whichever comes first.
+
+  def __init__(self, runner, max_batch_size=8, max_wait_ms=10, latency_window=1000):
+    self.runner = runner
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait_ms / 1000.
+    self.queue = queue.Queue()
+
+    self.lock = threading.Lock()
+    self.latencies = collections.deque(maxlen=latency_window)
+    self.batch_sizes = collections.deque(maxlen=latency_window)
+    self.requests = 0
+    self.errors = 0
+
+    self.thread = threading.Thread(target=self._run, name='batcher', daemon=True)
+    self.thread.start()
+
+  def translate(self, image):
+    # Blocks until `image`'s batch has been through the model and returns its
+    # output.
+    future = concurrent.futures.Future()
+    self.queue.put((image, future))
+    return future.result()
+
+  def _next_batch(self):
+    batch = [self.queue.get()]
+    deadline = time.perf_counter() + self.max_wait
+    while len(batch) < self.max_batch_size:
+      timeout = deadline - time.perf_counter()
+      if timeout <= 0:
+        break
+      try:
+        batch.append(self.queue.get(timeout=timeout))
+      except queue.Empty:
+        break
+    return batch
+
+  def _run(self):
+    while True:
+      batch = self._next_batch()
+      images, futures = zip(*batch)
+      try:
+        outputs = self.runner(np.stack(images))
+      except Exception as e:
+        for future in futures:
+          future.set_exception(e)
+        continue
+      with self.lock:
+        self.batch_sizes.append(len(batch))
+      for future, output in zip(futures, outputs):
+        future.set_result(output)
+
+  def record(self, seconds, error=False):
+    with self.lock:
+      self.requests += 1
+      self.errors += int(error)
+      if not error:
+        self.latencies.append(1000. * seconds)
+
+  def metrics(self):
+    with self.lock:
+      latencies = list(self.latencies)
+      batch_sizes = list(self.batch_sizes)
+      requests, errors = self.requests, self.errors
+    return {
+      'requests': requests,
+      'errors': errors,
+      'queue_depth': self.queue.qsize(),
+      'latency_ms': percentiles(latencies),
+      'mean_batch_size': float(np.mean(batch_sizes)) if batch_sizes else None,
+      'max_batch_size': self.max_batch_size,
+      'max_wait_ms': 1000. * self.max_wait,
+    }
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+  # POST /translate, GET /metrics and GET /health. The server's `batcher`
+  # attribute does the translating.
+
+  def do_POST(self):
+    if self.path != '/translate':
+      return self.send_error(404)
+    start = time.perf_counter()
+    batcher = self.server.batcher
+    try:
+      data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+      image = decode_request(data)
+    except Exception as e:
+      batcher.record(time.perf_counter() - start, error=True)
+      return self.send_error(400, 'Could not decode the image: {}'.format(e))
+    try:
+      body = tf.image.encode_png(batcher.translate(image),
+                                 compression=self.server.png_compression).numpy()
+    except Exception as e:
+      batcher.record(time.perf_counter() - start, error=True)
+      return self.send_error(500, str(e))
+    batcher.record(time.perf_counter() - start)
+    self.respond(body, 'image/png')
+
+  def do_GET(self):
+    if self.path == '/metrics':
+      self.respond(json.dumps(self.server.batcher.metrics()).encode('utf-8'), 'application/json')
+    elif self.path == '/health':
+      self.respond(b'ok\n', 'text/plain')
+    else:
+      self.send_error(404)
+
+  def respond(self, body, content_type):
+    self.send_response(200)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    # no line per request
+    pass
+
+
+def make_server(model_path, host='127.0.0.1', port=8500, max_batch_size=8, max_wait_ms=10,
+                num_threads=None, png_compression=1):
+  variant = 'saved_model' if os.path.isdir(model_path) else 'tflite'
+  runner = make_runner(variant, model_path, num_threads)
+  # the first call traces the model / allocates the interpreter
+  runner(np.zeros([1, IMG_HEIGHT, IMG_WIDTH, 3], np.uint8))
+
+  server = http.server.ThreadingHTTPServer((host, port), Handler)
+  server.daemon_threads = True
+  server.batcher = Batcher(runner, max_batch_size, max_wait_ms)
+  server.png_compression = png_compression
+  return server
+
+
+# ## Load test
+
+def post_image(url, data, timeout=60):
+  request = urllib.request.Request(url + '/translate', data=data,
+                                   headers={'Content-Type': 'application/octet-stream'})
+  with urllib.request.urlopen(request, timeout=timeout) as response:
+    return response.read()
+
+
+def load_test(url, data, concurrency=8, requests=100):
+  # Posts `data` `requests` times from `concurrency` threads and returns the
+  # client side latencies and throughput, plus the server's /metrics.
+  def timed(_):
+    start = time.perf_counter()
+    post_image(url, data)
+    return 1000. * (time.perf_counter() - start)
+
+  start = time.perf_counter()
+  with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+    latencies = list(pool.map(timed, range(requests)))
+  seconds = time.perf_counter() - start
+
+  with urllib.request.urlopen(url + '/metrics') as response:
+    server_metrics = json.loads(response.read().decode('utf-8'))
+  return {
+    'concurrency': concurrency,
+    'requests': requests,
+    'requests_per_sec': requests / seconds,
+    'latency_ms': percentiles(latencies),
+    'server': server_metrics,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Serve an exported pix2pix generator over HTTP')
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  serve_parser = subparsers.add_parser('serve', help='run the server')
+  serve_parser.add_argument('model', help='SavedModel directory or .tflite file from '
+                                          'pix2pix_export.py')
+  serve_parser.add_argument('--host', default='127.0.0.1')
+  serve_parser.add_argument('--port', type=int, default=8500)
+  serve_parser.add_argument('--max-batch-size', type=int, default=8)
+  serve_parser.add_argument('--max-wait-ms', type=float, default=10)
+  serve_parser.add_argument('--threads', type=int, default=None, help='TFLite interpreter threads')
+  serve_parser.add_argument('--png-compression', type=int, default=1,
+                            help='zlib level 0-9 of the returned PNGs, -1 for the default')
+  serve_parser.add_argument('--gpu', action='store_true',
+                            help='run the SavedModel on a GPU if there is one')
+
+  load_parser = subparsers.add_parser('loadtest', help='load test a running server')
+  load_parser.add_argument('url', help='e.g. http://localhost:8500')
+  load_parser.add_argument('image', help='image file to post')
+  load_parser.add_argument('--concurrency', type=int, default=8)
+  load_parser.add_argument('--requests', type=int, default=100)
+
+  args = parser.parse_args()
+
+  if args.command == 'serve':
+    if not args.gpu:
+      tf.config.set_visible_devices([], 'GPU')
+    server = make_server(args.model, args.host, args.port, args.max_batch_size,
+                         args.max_wait_ms, args.threads, args.png_compression)
+    print('Serving {} on http://{}:{}'.format(args.model, args.host, args.port))
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      server.server_close()
+
+  elif args.command == 'loadtest':
+    with open(args.image, 'rb') as f:
+      data = f.read()
+    print(json.dumps(load_test(args.url.rstrip('/'), data, args.concurrency, args.requests),
+                     indent=2))
+
+
+if __name__ == '__main__':
+  main()
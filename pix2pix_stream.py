@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming translation of a numbered frame sequence, e.g. an animation
+# rendered to frame_0001.png, frame_0002.png, ...:
+#
+#   python pix2pix_stream.py /content/drive/MyDrive/checkPoints OutAni3/ out/ --frozen-bn
+#
+# The model is a training checkpoint directory, as for pix2pix_infer.py, or a
+# SavedModel directory or .tflite file from pix2pix_export.py.
+#
+# Decoding, inference and PNG encoding run as separate stages connected by
+# bounded queues, so they overlap and the frame rate is set by the slowest
+# stage rather than by the sum of the three, while memory stays bounded:
+#
+#   tf.data decode (parallel) -> inference (batches) -> PNG encoders (thread
+#   pool) -> writer
+#
+# The writer takes the encoded frames in sequence order, so the frames are
+# written in order even though several are encoded at once. With
+# --skip-repeats a frame that decodes to exactly the previous frame (held
+# frames are common in animation) is not run through the generator or
+# encoded again; the previous output is written for it.
+#
+# At the end the time each stage was busy per frame is printed; the largest
+# is the stage that limits throughput.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import tensorflow as tf
+
+import argparse
+import concurrent.futures
+import os
+import queue
+import re
+import threading
+import time
+
+from pix2pix_data import IMG_WIDTH, IMG_HEIGHT, AUTOTUNE
+from pix2pix_infer import (load_generator, fold_batchnorm, make_translate, list_inputs,
+                           output_path)
+from pix2pix_export import make_runner
+
+
+def frame_key(path):
+  # Sorts frame_2.png before frame_10.png.
+  return [int(part) if part.isdigit() else part
+          for part in re.split(r'(\d+)', os.path.basename(path))]
+
+
+def list_frames(input_dir):
+  return sorted(list_inputs(input_dir), key=frame_key)
+
+
+def decode_frame(image_file):
+  image = tf.io.decode_image(tf.io.read_file(image_file), channels=3, expand_animations=False)
+  image = tf.image.resize(image, [IMG_HEIGHT, IMG_WIDTH],
+                          method=tf.image.ResizeMethod.NEAREST_NEIGHBOR)
+  return tf.cast(image, tf.uint8)
+
+
+def frame_dataset(files, buffer_size):
+  # Decoded uint8 frames in sequence order, decoded in parallel with at most
+  # `buffer_size` waiting.
+  dataset = tf.data.Dataset.from_tensor_slices(files)
+  dataset = dataset.map(decode_frame, num_parallel_calls=AUTOTUNE, deterministic=True)
+  return dataset.prefetch(buffer_size)
+
+
+def load_model(model_path, frozen_bn=False):
+  # A function from a uint8 [N, H, W, 3] batch to uint8 outputs.
+  if model_path.endswith('.tflite') or tf.saved_model.contains_saved_model(model_path):
+    variant = 'tflite' if model_path.endswith('.tflite') else 'saved_model'
+    return make_runner(variant, model_path)
+
+  generator = load_generator(model_path)
+  if frozen_bn:
+    generator = fold_batchnorm(generator)
+  translate = make_translate(generator, training=not frozen_bn)
+  return lambda images: translate((tf.cast(images, tf.float32) / 127.5) - 1).numpy()
+
+
+class StageTimer(object):
+  # Seconds each stage spent working, as opposed to waiting on its queues.
+
+  def __init__(self, names):
+    self.names = names
+    self.seconds = dict((name, 0.) for name in names)
+    self.lock = threading.Lock()
+
+  def add(self, name, seconds):
+    with self.lock:
+      self.seconds[name] += seconds
+
+
+_END = object()
+
+
+class _Closed(Exception):
+  # The stage a queue feeds has stopped, so nothing will take from it.
+  pass
+
+
+def put(output, item, closed, poll_secs=0.1):
+  # output.put(item), unless `closed` is set while the queue is full.
+  while not closed.is_set():
+    try:
+      output.put(item, timeout=poll_secs)
+      return
+    except queue.Full:
+      pass
+  raise _Closed()
+
+
+def stream_frames(model_fn, files, output_dir, batch_size=8, queue_size=16, encoders=4,
+                  skip_repeats=False, png_compression=1, report_every=100):
+  # Translates `files` in order into PNGs in output_dir and returns a dict of
+  # frame counts, seconds and per stage busy time.
+  os.makedirs(output_dir, exist_ok=True)
+  timer = StageTimer(('decode', 'inference', 'encode', 'write'))
+  decoded = queue.Queue(queue_size)
+  encoded = queue.Queue(queue_size)
+  # set once the inference stage / the writer has stopped taking from them
+  decoded_closed = threading.Event()
+  encoded_closed = threading.Event()
+  errors = []
+  counts = {'frames': 0, 'translated': 0, 'repeats': 0}
+
+  def run_stage(body, output, output_closed, input_closed=None):
+    # An exception ends the stage; the stages after it see the end of the
+    # stream, the ones before it stop, and the error is raised once the writer
+    # is done.
+    try:
+      body()
+    except _Closed:
+      pass
+    except Exception as e:
+      errors.append(e)
+    finally:
+      if input_closed is not None:
+        input_closed.set()
+      try:
+        put(output, _END, output_closed)
+      except _Closed:
+        pass
+
+  def decode():
+    previous = None
+    iterator = iter(frame_dataset(files, queue_size))
+    for image_file in files:
+      start = time.perf_counter()
+      image = next(iterator).numpy()
+      repeat = skip_repeats and previous is not None and np.array_equal(image, previous)
+      previous = image
+      timer.add('decode', time.perf_counter() - start)
+      put(decoded, (image_file, None if repeat else image), decoded_closed)
+
+  encoder_pool = concurrent.futures.ThreadPoolExecutor(max_workers=encoders)
+
+  def encode(image):
+    start = time.perf_counter()
+    data = tf.image.encode_png(image, compression=png_compression).numpy()
+    timer.add('encode', time.perf_counter() - start)
+    return data
+
+  def infer():
+    # Frames are gathered until there are batch_size to translate, then
+    # handed on in order; a repeat gets the future of the frame before it.
+    pending = []
+    last = [None]
+
+    def flush():
+      images = [image for _, image in pending if image is not None]
+      outputs = iter([])
+      if images:
+        start = time.perf_counter()
+        outputs = iter(model_fn(np.stack(images)))
+        timer.add('inference', time.perf_counter() - start)
+      for image_file, image in pending:
+        if image is not None:
+          last[0] = encoder_pool.submit(encode, next(outputs))
+        put(encoded, (image_file, last[0]), encoded_closed)
+      del pending[:]
+
+    while True:
+      item = decoded.get()
+      if item is _END:
+        break
+      pending.append(item)
+      if sum(image is not None for _, image in pending) >= batch_size:
+        flush()
+    flush()
+
+  decoder = threading.Thread(target=run_stage, args=(decode, decoded, decoded_closed),
+                             name='decode', daemon=True)
+  inference = threading.Thread(target=run_stage,
+                               args=(infer, encoded, encoded_closed, decoded_closed),
+                               name='inference', daemon=True)
+  start = time.time()
+  decoder.start()
+  inference.start()
+
+  # the writer runs here, in sequence order
+  previous = None
+  try:
+    while True:
+      item = encoded.get()
+      if item is _END:
+        break
+      image_file, future = item
+      data = future.result()
+      write_start = time.perf_counter()
+      path = output_path(image_file, output_dir)
+      tf.io.write_file(path + '.tmp', data)
+      os.replace(path + '.tmp', path)
+      timer.add('write', time.perf_counter() - write_start)
+
+      counts['frames'] += 1
+      if future is previous:
+        counts['repeats'] += 1
+      else:
+        counts['translated'] += 1
+      previous = future
+      if report_every and counts['frames'] % report_every == 0:
+        print('{} / {} frames, {:.1f} frames/sec'.format(
+            counts['frames'], len(files), counts['frames'] / (time.time() - start)))
+  finally:
+    encoded_closed.set()
+    inference.join()
+    decoder.join()
+    encoder_pool.shutdown(wait=True)
+  if errors:
+    raise errors[0]
+
+  counts['seconds'] = time.time() - start
+  counts['stage_seconds'] = timer.seconds
+  return counts
+
+
+def print_stream_report(result):
+  frames = max(result['frames'], 1)
+  print('{} frames ({} translated, {} repeats) in {:.1f} sec, {:.2f} frames/sec'.format(
+      result['frames'], result['translated'], result['repeats'], result['seconds'],
+      result['frames'] / result['seconds'] if result['seconds'] else 0.0))
+  # encode time is summed over the encoder threads
+  print('busy ms/frame: ' + ', '.join('{} {:.1f}'.format(name, 1000. * seconds / frames)
+                                      for name, seconds in result['stage_seconds'].items()))
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Translate a numbered frame sequence as a stream')
+  parser.add_argument('model', help='training checkpoint directory, or a SavedModel directory '
+                                    'or .tflite file from pix2pix_export.py')
+  parser.add_argument('input_dir')
+  parser.add_argument('output_dir')
+  parser.add_argument('--batch-size', type=int, default=8)
+  parser.add_argument('--queue-size', type=int, default=16,
+                      help='frames each queue between the stages holds')
+  parser.add_argument('--encoders', type=int, default=4, help='PNG encoder threads')
+  parser.add_argument('--skip-repeats', action='store_true',
+                      help='reuse the previous output for frames identical to the previous frame')
+  parser.add_argument('--frozen-bn', action='store_true',
+                      help='with a checkpoint, fold BatchNorm into the convolutions and disable '
+                           'Dropout, so a frame does not depend on the batch it is in')
+  parser.add_argument('--png-compression', type=int, default=1,
+                      help='zlib level 0-9, -1 for the default')
+  args = parser.parse_args()
+
+  files = list_frames(args.input_dir)
+  model_fn = load_model(args.model, args.frozen_bn)
+  result = stream_frames(model_fn, files, args.output_dir, args.batch_size, args.queue_size,
+                         args.encoders, args.skip_repeats, args.png_compression)
+  print_stream_report(result)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,28 @@
+# coding: utf-8
+
+# Export round trips with a narrow generator, so they run on a CPU in seconds:
+#
+#   python -m pytest -q test_pix2pix_export.py
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import pytest
+
+from pix2pix_data import IMG_WIDTH, IMG_HEIGHT
+from pix2pix_model import Generator
+from pix2pix_export import export_generator, make_runner
+
+
+@pytest.mark.parametrize('frozen_bn', [True, False])
+def test_export_saved_model(tmp_path, frozen_bn):
+  # frozen_bn=False is --batch-statistics, which serves training=True and so
+  # has to save the Dropout seed generators too
+  generator = Generator(base_filters=4, max_filters=8)
+  paths = export_generator(generator, str(tmp_path), frozen_bn=frozen_bn)
+
+  runner = make_runner('saved_model', paths['saved_model'])
+  images = np.random.randint(0, 256, [2, IMG_HEIGHT, IMG_WIDTH, 3], dtype=np.uint8)
+  outputs = runner(images)
+  assert outputs.shape == images.shape
+  assert outputs.dtype == np.uint8